@@ -13,9 +13,64 @@ if dir().count("pcr") == 0:
 # Maximum length of an instruction (for formatting purposes)
 maxLength = 4
 
+# Width of addresses in bits (bank and 16-bit address)
+addressWidth = 24
+
 # Leadin bytes for multibyte instructions
 leadInBytes = []
 
+# Byte order of 16-bit operands
+bigEndian = False
+
+# Flow control, used for flow analysis. Entries are mnemonics, or opcodes
+# where the mnemonic alone is not enough.
+#   jumpInstructions  - jumps and calls to an absolute address operand
+#   callInstructions  - subroutine calls (absolute or pc relative)
+#   finalInstructions - execution does not continue with the next instruction
+jumpInstructions = ["jmp", "jsr"]
+callInstructions = ["jsr"]
+finalInstructions = ["jmp", "bra", "brl", "rts", "rtl", "rti", "brk", "stp"]
+
+# Memory references, used for cross references. Entries as above.
+#   writeInstructions - instructions that write (or modify) their memory operand
+#   pointerModes      - addressing modes with a 16-bit immediate value, which may be an address
+writeInstructions = ["sta", "stx", "sty", "stz", "asl", "lsr", "rol", "ror", "inc", "dec", "trb", "tsb"]
+pointerModes = ["immediate16"]
+
+# Register widths, for the length of immediate operands.
+#   widthFlags         - status bits which select 8-bit registers (m and x); set after reset
+#   wideImmediates     - opcode: status bit; the immediate operand has 16 bits while the bit is clear
+#   wideMode           - addressing mode of the 16-bit immediate operands
+#   statusInstructions - mnemonic: how it changes the status bits. "clear"/"set" clear or set the bits
+#                        in the operand, "clearcarry"/"setcarry" the carry, and "exchangecarry" sets m
+#                        and x when the carry is set (switch to emulation mode) and leaves them as
+#                        they are when it is clear (switch to native mode). The CPU starts in
+#                        emulation mode, in which "clear" does not clear m and x.
+widthFlags = 0x30
+wideImmediates = {
+0x09 : 0x20,  # ora
+0x29 : 0x20,  # and
+0x49 : 0x20,  # eor
+0x69 : 0x20,  # adc
+0x89 : 0x20,  # bit
+0xa9 : 0x20,  # lda
+0xc9 : 0x20,  # cmp
+0xe9 : 0x20,  # sbc
+0xa0 : 0x10,  # ldy
+0xa2 : 0x10,  # ldx
+0xc0 : 0x10,  # cpy
+0xe0 : 0x10,  # cpx
+}
+wideMode = "immediate16"
+statusInstructions = {"rep": "clear", "sep": "set", "clc": "clearcarry", "sec": "setcarry", "xce": "exchangecarry"}
+
+# Entry points, used for flow analysis when no entry point is given.
+#   vectors     - addresses of 16-bit pointers to code (in the byte order above)
+#   entryPoints - fixed addresses where execution may start
+vectors = [0xffe4, 0xffe6, 0xffe8, 0xffea, 0xffee,  # native cop, brk, abort, nmi, irq
+           0xfff4, 0xfff8, 0xfffa, 0xfffc, 0xfffe]  # emulation cop, abort, nmi, reset, irq/brk
+entryPoints = []
+
 # Addressing mode table
 # List of addressing modes and corresponding format strings for operands.
 addressModeTable = {
@@ -25,6 +80,7 @@ addressModeTable = {
 "absolutey"               : "${1:02X}{0:02X},y",
 "accumulator"             : "a",
 "immediate"               : "#${0:02X}",
+"immediate16"             : "#${1:02X}{0:02X}",
 "indirectx"               : "(${0:02X},x)",
 "indirecty"               : "(${0:02X}),y",
 "indirect"                : "(${1:02X}{0:02X})",
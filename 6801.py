@@ -13,9 +13,38 @@
 # Maximum length of an instruction (for formatting purposes)
 maxLength = 3
 
+# Width of addresses in bits
+addressWidth = 16
+
 # Leadin bytes for multibyte instructions
 leadInBytes = []
 
+# Byte order of 16-bit operands
+bigEndian = True
+
+# Flow control, used for flow analysis. Entries are mnemonics, or opcodes
+# where the mnemonic alone is not enough.
+#   jumpInstructions  - jumps and calls to an absolute address operand
+#   callInstructions  - subroutine calls (absolute or pc relative)
+#   finalInstructions - execution does not continue with the next instruction
+jumpInstructions = ["jmp", "jsr"]
+callInstructions = ["jsr", "bsr"]
+finalInstructions = ["jmp", "bra", "rts", "rti"]
+
+# Memory references, used for cross references. Entries as above.
+#   writeInstructions - instructions that write (or modify) their memory operand
+#   pointerModes      - addressing modes with a 16-bit immediate value, which may be an address
+writeInstructions = ["staa", "stab", "std", "sts", "stx", "clr", "com", "neg", "inc", "dec", "asl", "asr", "lsr",
+                     "rol", "ror"]
+pointerModes = ["immediatex"]
+
+# Entry points, used for flow analysis when no entry point is given.
+#   vectors     - addresses of 16-bit pointers to code (in the byte order above)
+#   entryPoints - fixed addresses where execution may start
+vectors = [0xfff0, 0xfff2, 0xfff4, 0xfff6,  # sci, timer overflow, output compare, input capture
+           0xfff8, 0xfffa, 0xfffc, 0xfffe]  # irq, swi, nmi, reset
+entryPoints = []
+
 # Addressing mode table
 # List of addressing modes and corresponding format strings for operands.
 addressModeTable = {
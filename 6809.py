@@ -12,9 +12,38 @@ if dir().count("pcr") == 0:
 # Maximum length of an instruction (for formatting purposes)
 maxLength = 4
 
+# Width of addresses in bits
+addressWidth = 16
+
 # Leadin bytes for multbyte instructions
 leadInBytes = [0x10, 0x11]
 
+# Byte order of 16-bit operands
+bigEndian = True
+
+# Flow control, used for flow analysis. Entries are mnemonics, or opcodes
+# where the mnemonic alone is not enough.
+#   jumpInstructions  - jumps and calls to an absolute address operand
+#   callInstructions  - subroutine calls (absolute or pc relative)
+#   finalInstructions - execution does not continue with the next instruction
+jumpInstructions = ["jmp", "jsr"]
+callInstructions = ["jsr", "bsr", "lbsr"]
+finalInstructions = ["jmp", "bra", "lbra", "rts", "rti"]
+
+# Memory references, used for cross references. Entries as above.
+#   writeInstructions - instructions that write (or modify) their memory operand
+#   pointerModes      - addressing modes with a 16-bit immediate value, which may be an address
+writeInstructions = ["sta", "stb", "std", "sts", "stu", "stx", "sty", "clr", "com", "comb", "neg", "inc", "dec",
+                     "asr", "lsl", "lsr", "rol", "ror"]
+pointerModes = ["imm16"]
+
+# Entry points, used for flow analysis when no entry point is given.
+#   vectors     - addresses of 16-bit pointers to code (in the byte order above)
+#   entryPoints - fixed addresses where execution may start
+vectors = [0xfff2, 0xfff4, 0xfff6, 0xfff8,  # swi3, swi2, firq, irq
+           0xfffa, 0xfffc, 0xfffe]  # swi, nmi, reset
+entryPoints = []
+
 # Notes:
 # Not all addressing modes are implemented.
 
@@ -18,9 +18,37 @@ if dir().count("pcr") == 0:
 # Maximum length of an instruction (for formatting purposes)
 maxLength = 5
 
+# Width of addresses in bits
+addressWidth = 16
+
 # Leadin bytes for multbyte instructions
 leadInBytes = [0x18, 0x1a, 0xcd]
 
+# Byte order of 16-bit operands
+bigEndian = True
+
+# Flow control, used for flow analysis. Entries are mnemonics, or opcodes
+# where the mnemonic alone is not enough.
+#   jumpInstructions  - jumps and calls to an absolute address operand
+#   callInstructions  - subroutine calls (absolute or pc relative)
+#   finalInstructions - execution does not continue with the next instruction
+jumpInstructions = ["jmp", "jsr"]
+callInstructions = ["jsr", "bsr"]
+finalInstructions = ["jmp", "bra", "rts", "rti"]
+
+# Memory references, used for cross references. Entries as above.
+#   writeInstructions - instructions that write (or modify) their memory operand
+#   pointerModes      - addressing modes with a 16-bit immediate value, which may be an address
+writeInstructions = ["staa", "stab", "std", "sts", "stx", "sty", "clr", "com", "neg", "inc", "dec", "asr", "lsl",
+                     "lsr", "rol", "ror"]
+pointerModes = ["immediatex"]
+
+# Entry points, used for flow analysis when no entry point is given.
+#   vectors     - addresses of 16-bit pointers to code (in the byte order above)
+#   entryPoints - fixed addresses where execution may start
+vectors = list(range(0xffd6, 0x10000, 2))  # sci ... reset
+entryPoints = []
+
 # Addressing mode table
 addressModeTable = {
 "inherent"   : "",
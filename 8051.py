@@ -13,9 +13,36 @@ if dir().count("pcr") == 0:
 # Maximum length of an instruction (for formatting purposes)
 maxLength = 3
 
+# Width of addresses in bits
+addressWidth = 16
+
 # Leadin bytes for multibyte instructions
 leadInBytes = []
 
+# Byte order of 16-bit operands
+bigEndian = True
+
+# Flow control, used for flow analysis. Entries are mnemonics, or opcodes
+# where the mnemonic alone is not enough.
+#   jumpInstructions  - jumps and calls to an absolute address operand
+#   callInstructions  - subroutine calls (absolute or pc relative)
+#   finalInstructions - execution does not continue with the next instruction
+jumpInstructions = ["ljmp", "lcall"]
+callInstructions = ["lcall", "acall"]
+finalInstructions = ["ljmp", "ajmp", "sjmp", "jmp", "ret", "reti"]
+
+# Memory references, used for cross references. Entries as above.
+#   writeInstructions - instructions that write (or modify) their memory operand
+#   pointerModes      - addressing modes with a 16-bit immediate value, which may be an address
+writeInstructions = []
+pointerModes = []
+
+# Entry points, used for flow analysis when no entry point is given.
+#   vectors     - addresses of 16-bit pointers to code (in the byte order above)
+#   entryPoints - fixed addresses where execution may start
+vectors = []
+entryPoints = [0x0000, 0x0003, 0x000b, 0x0013, 0x001b, 0x0023]  # reset, int0, timer0, int1, timer1, serial
+
 # Addressing mode table
 # List of addressing modes and corresponding format strings for operands.
 addressModeTable = {
@@ -52,7 +79,7 @@ addressModeTable = {
 "a,r7"             : "a,r7",
 "ab"               : "ab",
 "addr11"           : "${0:02X}",
-"addr16"           : "${1:02X}{0:02X}",
+"addr16"           : "${0:02X}{1:02X}",
 "bit"              : "${0:02X}",
 "bit,c"            : "${0:02X},c",
 "bit,offset"       : "${0:02X},${1:02X}",
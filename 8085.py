@@ -10,9 +10,38 @@
 # Maximum length of an instruction (for formatting purposes)
 maxLength = 3
 
+# Width of addresses in bits
+addressWidth = 16
+
 # Leadin bytes for multibyte instructions
 leadInBytes = []
 
+# Byte order of 16-bit operands
+bigEndian = False
+
+# Flow control, used for flow analysis. Entries are mnemonics, or opcodes
+# where the mnemonic alone is not enough.
+#   jumpInstructions  - jumps and calls to an absolute address operand
+#   callInstructions  - subroutine calls (absolute or pc relative)
+#   finalInstructions - execution does not continue with the next instruction
+jumpInstructions = ["jmp", "jnz", "jz", "jnc", "jc", "jpo", "jpe", "jp", "jm",
+                    "call", "cnz", "cz", "cnc", "cc", "cpo", "cpe", "cp", "cm"]
+callInstructions = ["call", "cnz", "cz", "cnc", "cc", "cpo", "cpe", "cp", "cm"]
+finalInstructions = ["jmp", "ret", "pchl"]
+
+# Memory references, used for cross references. Entries as above.
+#   writeInstructions - instructions that write (or modify) their memory operand
+#   pointerModes      - addressing modes with a 16-bit immediate value, which may be an address
+writeInstructions = ["sta", "shld"]
+pointerModes = ["immxb", "immxd", "immxh", "immxsp"]
+
+# Entry points, used for flow analysis when no entry point is given.
+#   vectors     - addresses of 16-bit pointers to code (in the byte order above)
+#   entryPoints - fixed addresses where execution may start
+vectors = []
+entryPoints = [0x0000, 0x0008, 0x0010, 0x0018, 0x0020, 0x0028, 0x0030, 0x0038,  # reset, rst 1..7
+               0x0024, 0x002c, 0x0034, 0x003c]  # trap, rst 5.5, 6.5, 7.5
+
 # Addressing mode table
 # List of addressing modes and corresponding format strings for operands.
 addressModeTable = {
@@ -0,0 +1,157 @@
+''' batch mode: disassemble many files in a pool of worker processes
+
+    udis.py batch [options] source
+
+source is a directory (all files matching --glob) or a manifest: a text file with
+per line
+
+    <file>, <cpu>, <address>[, <block file>[, <label file>[, <output file>]]]
+
+Paths in a manifest are relative to the manifest; empty fields take the value of the
+command line option. Each listing goes to its own file in the output directory
+(<file name>.asm unless given), so the result does not depend on the order in which
+the workers finish. A report with the time of each file is written to standard
+output in the order of the input. '''
+
+import argparse
+import fnmatch
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from disassembler import Disassembler, compileTables
+from output import LineWriter
+import cache
+import udis
+
+
+class Job:
+    ''' One file to disassemble '''
+
+    def __init__(self, filename, cpu, address, block="", labels="", output=""):
+        self.filename = filename
+        self.cpu = cpu
+        self.address = address
+        self.block = block
+        self.labels = labels
+        self.output = output or os.path.basename(filename) + ".asm"
+
+
+def readManifest(filename, args):
+    ''' Return the jobs of a manifest file '''
+    base = os.path.dirname(os.path.abspath(filename))
+
+    def path(name):
+        return os.path.join(base, name) if name else ""
+
+    jobs = []
+    with open(filename, "r") as manifest:
+        lines = manifest.read().split('\n')
+    for singleline in lines:
+        if singleline.strip() == '' or singleline.strip().startswith('#'):
+            continue
+        fields = [field.strip() for field in singleline.split(',')]
+        fields += [''] * (6 - len(fields))
+        jobs.append(Job(path(fields[0]), fields[1] or args.cpu, udis.parseAddress(fields[2] or args.address),
+                        path(fields[3]), path(fields[4]), fields[5]))
+    return jobs
+
+
+def scanDirectory(directory, args):
+    ''' Return the jobs for the files in directory matching the --glob patterns '''
+    jobs = []
+    for name in sorted(os.listdir(directory)):
+        filename = os.path.join(directory, name)
+        if os.path.isfile(filename) and any(fnmatch.fnmatch(name, pattern) for pattern in args.glob):
+            block = os.path.join(directory, args.block) if args.block else ""
+            jobs.append(Job(filename, args.cpu, udis.parseAddress(args.address), block))
+    return jobs
+
+
+def loadPlugins(cpus, undocumented):
+    ''' Worker initializer: load and compile the CPU plugins once per process '''
+    for cpu in cpus:
+        try:
+            compileTables(cpu, undocumented)
+        except (FileNotFoundError, ValueError):
+            pass        # reported for each job using it
+
+
+def run(job, args, outdir):
+    ''' Disassemble one job; return (seconds, error message or None) '''
+    start = time.perf_counter()
+    output = os.path.join(outdir, job.output)
+    try:
+        dis = Disassembler(job.cpu, nolist=args.nolist, undocumented=args.undocumented,
+                           invalid=args.invalid, perLine=args.perline, charset=args.charset)
+        if job.block:
+            dis.readBlocks(job.block)
+        if job.labels:
+            dis.readLabelFile(job.labels)
+        else:
+            dis.readLabels(job.filename)
+        image = udis.readImage(job.filename, args.type)
+        store = udis.openCache(args)
+        lines = None
+        if store is not None:
+            key = cache.cacheKey(dis, image, job.address, udis.cacheOptions(args))
+            lines = store.get(key)
+        if lines is None:
+            lines = udis.listing(dis, image, job.address, args)
+            if store is not None:
+                lines = store.store(key, lines)
+        with open(output, "w") as outfd, LineWriter(outfd) as writer:
+            writer.writeLines(lines)
+    except Exception as error:      # report any failure of a job, and go on
+        if os.path.exists(output):
+            os.remove(output)
+        return time.perf_counter() - start, "{}: {}".format(type(error).__name__, error)
+    return time.perf_counter() - start, None
+
+
+def main(argv):
+    ''' Run the batch command with arguments argv; return the exit status '''
+    parser = argparse.ArgumentParser(prog="udis.py batch")
+    parser.add_argument("source", help="Directory with binary files, or manifest file")
+    udis.addOptions(parser)
+    parser.add_argument("-d", "--outdir", help="Directory for the listings (defaults to the current directory)", default=".")
+    parser.add_argument("-g", "--glob", help="File name pattern for a directory (repeatable, defaults to *.bin and *.rom)", action="append")
+    parser.add_argument("-j", "--jobs", help="Number of worker processes (defaults to the number of CPUs)", type=int, default=None)
+    args = parser.parse_args(argv)
+    args.glob = args.glob or ["*.bin", "*.rom"]
+
+    try:
+        if os.path.isdir(args.source):
+            jobs = scanDirectory(args.source, args)
+        else:
+            jobs = readManifest(args.source, args)
+    except (OSError, ValueError) as error:
+        print("error: {}".format(error), file=sys.stderr)
+        return 1
+
+    outputs = [job.output for job in jobs]
+    duplicates = sorted(name for name, count in Counter(outputs).items() if count > 1)
+    if duplicates:
+        print("error: more than one job writes to " + ", ".join(duplicates), file=sys.stderr)
+        return 1
+    os.makedirs(args.outdir, exist_ok=True)
+
+    start = time.perf_counter()
+    cpus = sorted({job.cpu for job in jobs})
+    with ProcessPoolExecutor(args.jobs, initializer=loadPlugins, initargs=(cpus, args.undocumented)) as pool:
+        futures = [pool.submit(run, job, args, args.outdir) for job in jobs]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for job, (seconds, error) in zip(jobs, results):
+        if error is None:
+            print("ok     {0:8.3f}s  {1}  -> {2}".format(seconds, job.filename, job.output))
+        else:
+            failed += 1
+            print("FAILED {0:8.3f}s  {1}  {2}".format(seconds, job.filename, error))
+    print("{0} files, {1} failed, {2:.3f}s cpu, {3:.3f}s elapsed".format(
+        len(jobs), failed, sum(result[0] for result in results), elapsed))
+    return 1 if failed else 0
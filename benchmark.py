@@ -0,0 +1,206 @@
+''' benchmark of the disassembler for each CPU plugin and several kinds of images
+
+    python3 benchmark.py [options]
+
+For each CPU and image the listing is made (decoded and formatted, like udis.py
+does without options) a number of times, and the best time is used. Reported are
+the plugin load time (executing and compiling the plugin), bytes and instructions
+per second, and the peak memory of the Python heap during one listing. The images:
+  atom   - the Acorn Atom ROMs in example/ (4 KB each)
+  random - random bytes
+  code   - valid instructions only
+  data   - random bytes in one byte block
+  fill   - mostly runs of $00 and $FF with some random bytes in between
+The results can be written as JSON (-o) and compared with an earlier run
+(--compare). '''
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import disassembler
+from disassembler import Disassembler, PLUGINDIR
+
+PLUGINS = ("1802", "6502", "6502_labels", "65816", "65c02", "6800", "6801", "6809", "6811",
+           "8051", "8080", "8085", "z80")
+SHAPES = ("atom", "random", "code", "data", "fill")
+ATOMROMS = (("Atom_Basic.rom", 0xC000), ("Atom_Kernel.rom", 0xF000))
+UNITS = {"K": 1 << 10, "M": 1 << 20}
+
+
+def parseSize(text):
+    ''' Return the number of bytes of text like 4096, 64K or 16M '''
+    text = text.strip().upper()
+    if text[-1:] in UNITS:
+        return int(text[:-1]) * UNITS[text[-1]]
+    return int(text)
+
+
+def sizeText(size):
+    for unit in ("M", "K"):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return str(size // UNITS[unit]) + unit
+    return str(size)
+
+
+def codeImage(dis, size, rng):
+    ''' Return size bytes of random valid instructions of dis (the last one may be cut off) '''
+    table = dis.decodeTable
+    opcodes = [opcode for opcode in range(256) if table[opcode] is not None]
+    image = bytearray()
+    while len(image) < size:
+        opcode = rng.choice(opcodes)
+        entry = table[opcode]
+        if entry.__class__ is list:
+            second = [code for code in range(256) if entry[code] is not None]
+            if not second:
+                continue
+            code = rng.choice(second)
+            image += bytes((opcode, code)) + rng.randbytes(entry[code][0] - 2)
+        else:
+            image.append(opcode)
+            image += rng.randbytes(entry[0] - 1)
+    return bytes(image[:size])
+
+
+def fillImage(size, rng):
+    ''' Return size bytes of mostly fill runs '''
+    image = bytearray()
+    while len(image) < size:
+        image += bytes([rng.choice((0x00, 0xff))]) * rng.randint(64, 1024)
+        image += rng.randbytes(rng.randint(1, 64))
+    return bytes(image[:size])
+
+
+def images(shape, dis, sizes, rng):
+    ''' Return a list of (name, image, address, blocks) for shape '''
+    if shape == "atom":
+        result = []
+        for name, address in ATOMROMS:
+            with open(os.path.join(PLUGINDIR, "example", name), "rb") as rom:
+                result.append((name, rom.read(), address, []))
+        return result
+    result = []
+    for size in sizes:
+        if shape == "random":
+            result.append((sizeText(size), rng.randbytes(size), 0, []))
+        elif shape == "code":
+            result.append((sizeText(size), codeImage(dis, size, rng), 0, []))
+        elif shape == "data":
+            result.append((sizeText(size), rng.randbytes(size), 0, [[0, min(size, dis.addressMask + 1) - 1, 'b']]))
+        elif shape == "fill":
+            result.append((sizeText(size), fillImage(size, rng), 0, []))
+    return result
+
+
+def loadTime(cpu):
+    ''' Return the seconds to load and compile the plugin of cpu, without the caches '''
+    disassembler._plugins.pop(cpu, None)
+    for key in [key for key in disassembler._tables if key[0] == cpu]:
+        del disassembler._tables[key]
+    start = time.perf_counter()
+    Disassembler(cpu)
+    return time.perf_counter() - start
+
+
+def listing(dis, image, address):
+    ''' Make the listing of image; return the number of records and of instructions '''
+    records = instructions = 0
+    for ins in dis.decode(image, address):
+        records += 1
+        if ins.mnemonic[0] != "." and ins.mnemonic != "end":
+            instructions += 1
+    for line in dis.formatListing(dis.decode(image, address)):
+        pass
+    return records, instructions
+
+
+def measure(cpu, shape, name, image, address, blocks, repeat, memory):
+    ''' Return the result of one benchmark as a dict '''
+    dis = Disassembler(cpu)
+    dis.setBlocks(blocks)
+    dis.setAddressDigits((address & dis.addressMask) + len(image) - 1)
+    records, instructions = listing(dis, image, address)
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for line in dis.formatListing(dis.decode(image, address)):
+            pass
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        for line in dis.formatListing(dis.decode(image, address)):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"cpu": cpu, "shape": shape, "image": name, "bytes": len(image), "records": records,
+            "instructions": instructions, "seconds": best, "bytesPerSecond": len(image) / best,
+            "instructionsPerSecond": instructions / best, "peakMemory": peak}
+
+
+def compare(results, filename):
+    ''' Print the speed of results relative to the results in filename '''
+    with open(filename, "r") as base:
+        old = {(r["cpu"], r["shape"], r["image"]): r for r in json.load(base)["results"]}
+    print("\n{0:12s} {1:7s} {2:16s} {3:>8s}".format("cpu", "shape", "image", "speed"))
+    for result in results:
+        previous = old.get((result["cpu"], result["shape"], result["image"]))
+        if previous is not None:
+            print("{0:12s} {1:7s} {2:16s} {3:7.2f}x".format(result["cpu"], result["shape"], result["image"],
+                                                           result["bytesPerSecond"] / previous["bytesPerSecond"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the disassembler")
+    parser.add_argument("-c", "--cpu", help="CPU plugin (repeatable, defaults to all)", action="append")
+    parser.add_argument("-s", "--shape", help="Kind of image: " + ", ".join(SHAPES) + " (repeatable, defaults to all)",
+                        action="append", choices=SHAPES)
+    parser.add_argument("--sizes", help="Comma separated sizes of the synthetic images (defaults to 4K,64K,1M; up to 16M)",
+                        default="4K,64K,1M")
+    parser.add_argument("-r", "--repeat", help="Number of timed runs of each benchmark (defaults to 3)", type=int, default=3)
+    parser.add_argument("--no-memory", help="Don't measure the peak memory (which takes an extra, slower run)", action="store_true")
+    parser.add_argument("--seed", help="Seed for the synthetic images (defaults to 1)", type=int, default=1)
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file", default="")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare the speed with", default="")
+    args = parser.parse_args(argv)
+
+    cpus = args.cpu or PLUGINS
+    shapes = args.shape or SHAPES
+    sizes = [parseSize(size) for size in args.sizes.split(",")]
+
+    print("{0:12s} {1:7s} {2:16s} {3:>10s} {4:>12s} {5:>12s} {6:>10s}".format(
+        "cpu", "shape", "image", "load ms", "bytes/s", "instr/s", "peak KB"))
+    results = []
+    for cpu in cpus:
+        load = loadTime(cpu)
+        dis = Disassembler(cpu)
+        rng = random.Random(args.seed)
+        for shape in shapes:
+            for name, image, address, blocks in images(shape, dis, sizes, rng):
+                result = measure(cpu, shape, name, image, address, blocks, args.repeat, not args.no_memory)
+                result["loadSeconds"] = load
+                results.append(result)
+                peak = "-" if result["peakMemory"] is None else str(result["peakMemory"] >> 10)
+                print("{0:12s} {1:7s} {2:16s} {3:10.2f} {4:12.0f} {5:12.0f} {6:>10s}".format(
+                    cpu, shape, name, load * 1000, result["bytesPerSecond"], result["instructionsPerSecond"], peak))
+                sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, "w") as outfd:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "date": time.strftime("%Y-%m-%d %H:%M:%S"), "repeat": args.repeat, "seed": args.seed,
+                       "results": results}, outfd, indent=1)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
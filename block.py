@@ -0,0 +1,71 @@
+''' blocks of bytes/words/strings which aren't executable code '''
+
+from bisect import bisect_right
+import heapq
+
+
+# reading the blocklist
+def readBlocks(filename):
+    ''' Read a block file with per line: <start>, <end>[, <type>] (hex addresses) '''
+    blocks = []
+    with open(filename, "r") as blockfd:
+        lines = blockfd.read().split('\n')
+    for singleline in lines:
+        if singleline.strip() != '':
+            line = singleline.split(',')
+            start = int(line[0].strip(), base=16)
+            end = int(line[1].strip(), base=16)
+            try:
+                btype = line[2].strip()[0]
+            except IndexError:
+                btype = 'b'     # defaults to bytes
+            blocks.append([start, end, btype])
+    return blocks
+
+
+class BlockMap:
+    ''' Sorted, non-overlapping list of blocks [start, end, type] with a binary search.
+        Where blocks overlap the one starting later is used; a block that encloses
+        another one continues after it. '''
+
+    def __init__(self, blocks=()):
+        self.blocks = []
+        pending = [list(block) for block in blocks]
+        heapq.heapify(pending)
+        while pending:
+            start, end, btype = heapq.heappop(pending)
+            if start > end:
+                continue
+            if self.blocks and self.blocks[-1][1] >= start:
+                prev = self.blocks[-1]
+                if prev[1] > end:
+                    heapq.heappush(pending, [end + 1, prev[1], prev[2]])
+                prev[1] = start - 1
+                if prev[1] < prev[0]:
+                    self.blocks.pop()
+            self.blocks.append([start, end, btype])
+        self.starts = [block[0] for block in self.blocks]
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def lookup(self, address):
+        ''' Return (block, low, high): the block containing address (or None) and the
+            range low..high around address for which that answer is the same '''
+        i = bisect_right(self.starts, address) - 1
+        if i >= 0 and self.blocks[i][1] >= address:
+            block = self.blocks[i]
+            return block, block[0], block[1]
+        low = self.blocks[i][1] + 1 if i >= 0 else 0
+        if i + 1 < len(self.blocks):
+            high = self.starts[i + 1] - 1
+        else:
+            high = float("inf")
+        return None, low, high
+
+    def find(self, address):
+        ''' Return the block containing address, or None '''
+        return self.lookup(address)[0]
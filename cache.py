@@ -0,0 +1,108 @@
+''' on-disk cache of listings, keyed on the hash of everything that determines them
+
+The key is the SHA-256 of the image (with the load addresses of its segments), the
+CPU plugin and the modules of the disassembler, the starting address, the blocks and
+labels (the contents of the block and label files), and the output options. Each
+listing is a file <key>.lst in the cache directory. A hit sets the modification time
+of its file, and when the files take more than the maximum size the least recently
+used ones are removed. Files are written under a temporary name and then renamed,
+so processes can share a cache directory. '''
+
+import hashlib
+import os
+import tempfile
+
+from disassembler import PLUGINDIR
+from memory import SegmentMap
+
+# Modules whose code determines the listing
+SOURCES = ("disassembler.py", "block.py", "label.py", "flow.py", "xref.py", "memory.py", "charset.py", "stats.py",
+           "parallel.py", "udis.py")
+# Default maximum size of the cache directory in bytes
+DEFAULTSIZE = 256 << 20
+SUFFIX = ".lst"
+
+
+def cacheKey(dis, image, address, options):
+    ''' Return the key for the listing of image (bytes or SegmentMap) loaded at address
+        by dis with its blocks and labels; options is a tuple of the other settings
+        that change the listing '''
+    digest = hashlib.sha256()
+    for name in SOURCES + (dis.cpu + ".py",):
+        with open(os.path.join(PLUGINDIR, name), "rb") as source:
+            digest.update(source.read())
+    digest.update(repr((address, options, list(dis.blocks), dis.labellist, sorted(dis.statusAt.items()))).encode())
+    if isinstance(image, SegmentMap):
+        for base, data in image:
+            digest.update(repr((base, len(data))).encode())
+            digest.update(data)
+        digest.update(repr(image.entries).encode())
+    else:
+        digest.update(image)
+    return digest.hexdigest()
+
+
+class ListingCache:
+    ''' The listings in directory, together at most maxSize bytes '''
+
+    def __init__(self, directory, maxSize=DEFAULTSIZE):
+        self.directory = directory
+        self.maxSize = maxSize
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        ''' Return the lines of the listing with key, or None if it is not cached '''
+        path = self.path(key)
+        try:
+            with open(path, "r") as listing:
+                text = listing.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return text.split("\n")[:-1]
+
+    def put(self, key, lines):
+        ''' Store the listing lines under key, and evict the least recently used listings
+            if the cache is too large '''
+        handle, temporary = tempfile.mkstemp(SUFFIX + ".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "w") as listing:
+                listing.write("\n".join(lines) + "\n")
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.evict()
+
+    def store(self, key, lines):
+        ''' Generator for lines, which puts them in the cache under key when all are given '''
+        kept = []
+        for line in lines:
+            kept.append(line)
+            yield line
+        self.put(key, kept)
+
+    def evict(self):
+        ''' Remove the least recently used listings until the cache fits in maxSize '''
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                try:
+                    status = entry.stat()
+                except FileNotFoundError:
+                    continue        # removed by another process
+                files.append((status.st_mtime, status.st_size, entry.path))
+                total += status.st_size
+        files.sort()
+        for mtime, size, path in files:
+            if total <= self.maxSize:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,75 @@
+''' character sets of the text in images: how the bytes of .ascii and .string data are
+shown, and finding the strings in an image
+
+A character set is a table with for each byte value the character it shows, or None
+if it is not a printable character of the set:
+  ascii   - ASCII $20-$7E
+  highbit - ASCII with or without bit 7 set (as on the Apple II)
+  petscii - PETSCII of the Commodore 8-bit computers, upper case and graphics set:
+            $20-$5D, without the pound sign, and the shifted letters $C1-$DA
+  atom    - the upper case ASCII $20-$5F of the Acorn Atom '''
+
+import re
+
+
+def _table(printable, character=chr):
+    return [character(b) if printable(b) else None for b in range(256)]
+
+
+CHARSETS = {
+    "ascii": _table(lambda b: 0x20 <= b <= 0x7e),
+    "highbit": _table(lambda b: 0x20 <= b & 0x7f <= 0x7e, lambda b: chr(b & 0x7f)),
+    "petscii": _table(lambda b: 0x20 <= b <= 0x5d and b != 0x5c or 0xc1 <= b <= 0xda, lambda b: chr(b & 0x7f)),
+    "atom": _table(lambda b: 0x20 <= b <= 0x5f),
+}
+DEFAULT = "ascii"
+
+# Characters escaped in .string directives, which are quoted with '
+ESCAPES = {"'": "\\'", "\\": "\\\\"}
+
+
+def asciiText(name=DEFAULT):
+    ''' Return the text of each byte value in .ascii directives '''
+    return [char if char is not None else "${0:02X}".format(b) for b, char in enumerate(CHARSETS[name])]
+
+
+def stringText(name=DEFAULT):
+    ''' Return the text of each byte value in the quoted text of .string directives '''
+    return [ESCAPES.get(char, char) if char is not None else "\\x{0:02x}".format(b) for b, char in enumerate(CHARSETS[name])]
+
+
+_classes = {}
+
+
+def classTable(name):
+    ''' Return the bytes.translate table of the class of each byte value for the string
+        scanner: l for a letter or space, p for another printable character, z for NUL,
+        c for CR, h for a byte with bit 7 set which is printable without it, and x for
+        the other bytes '''
+    if name not in _classes:
+        table = CHARSETS[name]
+        classes = bytearray(b"x" * 256)
+        for b, char in enumerate(table):
+            if char is not None:
+                classes[b] = ord("l") if char.isalpha() or char == " " else ord("p")
+            elif b >= 0x80 and table[b & 0x7f] is not None:
+                classes[b] = ord("h")
+        classes[0x00] = ord("z")
+        classes[0x0d] = ord("c")
+        _classes[name] = bytes(classes)
+    return _classes[name]
+
+
+def stringRuns(image, name=DEFAULT, minLength=6, minLetters=0.5):
+    ''' Return (start, stop, type) for the strings in image (bytes) as offsets: the runs
+        of at least minLength printable characters of the character set, at least a
+        share minLetters of them letters or spaces, with a terminating NUL or CR (type
+        s), or with a terminating byte with bit 7 set as in the keyword table of Atom
+        BASIC (type a) '''
+    classes = bytes(image).translate(classTable(name))
+    runs = []
+    for match in re.finditer(b"[lp]{%d,}([zch]?)" % max(minLength, 1), classes):
+        if match.group().count(b"l") >= minLetters * (match.start(1) - match.start()):
+            runs.append((match.start(), match.end(), 'a' if match.group(1) == b"h" else 's'))
+    return runs
+
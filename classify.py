@@ -0,0 +1,259 @@
+''' classify: guess the code and data regions of an image and write them as a block file
+
+    udis.py classify [options] filename
+
+Each offset of the image is scored with array operations (NumPy is needed) over
+sliding windows. The data found, in this order:
+  fill   - runs of at least --min-fill equal bytes                            (b)
+  text   - runs of at least --min-string printable characters of the character
+           set, mostly letters, also with a terminating NUL or CR            (s)
+           or with a terminating character with bit 7 set                    (a)
+  tables - runs of words which all point to instructions in the image         (w, W)
+  data   - the rest where the instructions in a window around the offset are
+           too often invalid or undocumented, where the branches, jumps and
+           calls go to the middle of instructions or to data, or where the
+           byte entropy is low                                                (b)
+Code between data which is shorter than a window is taken as data too. For a CPU
+with register width tracking (65816) the instructions are those of the listing,
+with the widths set by rep, sep and xce. With --strings only the text is found. The block file written (standard output without
+-o) can be used with -b, and edited. '''
+
+import argparse
+import sys
+
+from disassembler import Disassembler, pcr, jump, call, final, und
+import charset
+import loader
+import stats
+from memory import SegmentMap
+from udis import parseAddress, readImage
+
+numpy = stats.numpy
+
+# Defaults of the options
+WINDOW = 32
+MINSTRING = 6
+MINFILL = 8
+# Minimum number of words in a table
+MINTABLE = 3
+# A window of code has at most this share of invalid opcodes (undocumented ones
+# count half) and of branches to the middle of an instruction
+MAXINVALID = 0.1
+MAXBADBRANCH = 0.5
+# The branches are scored over this number of windows, if there are enough
+BRANCHWINDOWS = 4
+MINBRANCHES = 3
+# Bytes with a lower entropy in bits (of at most 6 for 64 bytes) are data
+MINENTROPY = 2.0
+ENTROPYWINDOW = 64
+# Block types of the offsets; CODE is not written to the block file
+CODE, BYTES, ASCII, STRING, WORDS = range(5)
+TYPES = " basw"
+
+
+def runs(flags):
+    ''' Return (starts, stops) of the runs of True in the bool array flags '''
+    edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], flags.view(numpy.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+
+def windowSum(values, width):
+    ''' Return for each offset the sum of values in the window of width offsets around it '''
+    total = numpy.concatenate(([0], numpy.cumsum(values)))
+    offsets = numpy.arange(len(values))
+    return total[numpy.minimum(offsets + width - width // 2, len(values))] - total[numpy.maximum(offsets - width // 2, 0)]
+
+
+def entropy(img, width):
+    ''' Return for each offset the entropy in bits of the bytes of its part of width bytes '''
+    size = len(img)
+    parts = -(-size // width)
+    bits = numpy.empty(parts)
+    step = 4096         # parts counted at once
+    for first in range(0, parts, step):
+        chunk = img[first * width:(first + step) * width]
+        index = numpy.arange(len(chunk)) // width
+        counts = numpy.bincount(index * 256 + chunk, minlength=(index[-1] + 1) * 256).reshape(-1, 256)
+        share = counts / counts.sum(axis=1)[:, None]
+        logs = numpy.log2(share, out=numpy.zeros_like(share), where=share > 0)
+        bits[first:first + len(counts)] = -(share * logs).sum(axis=1)
+    return numpy.repeat(bits, width)[:size]
+
+
+def fillRuns(img, minFill):
+    ''' Return a bool array of the bytes in runs of at least minFill equal bytes '''
+    fill = numpy.zeros(len(img), bool)
+    first, stop = runs(img[1:] == img[:-1])
+    for start, end in zip(first[stop - first >= minFill - 1], stop[stop - first >= minFill - 1]):
+        fill[start:end + 1] = True
+    return fill
+
+
+def textRuns(image, kinds, name, minString):
+    ''' Mark the strings found by charset.stringRuns in kinds, where nothing else is '''
+    for start, stop, btype in charset.stringRuns(image, name, minString):
+        part = kinds[start:stop]
+        part[part == CODE] = STRING if btype == 's' else ASCII
+
+
+def wordTables(dis, img, address, kinds, isStart):
+    ''' Mark the runs of words pointing to instructions (isStart) in kinds as WORDS '''
+    size = len(img)
+    if size < 2:
+        return
+    high, low = (img[:-1], img[1:]) if dis.bigEndian else (img[1:], img[:-1])
+    target = ((high.astype(numpy.int64) << 8 | low) - address) & dis.addressMask
+    inside = target < size
+    pointer = numpy.zeros(size - 1, bool)
+    pointer[inside] = isStart[target[inside]]
+    for parity in (0, 1):
+        free = pointer & (kinds[:-1] == CODE) & (kinds[1:] == CODE)
+        first, stop = runs(free[parity::2])
+        for start, end in zip(first[stop - first >= MINTABLE], stop[stop - first >= MINTABLE]):
+            kinds[parity + 2 * start:parity + 2 * end] = WORDS
+
+
+def blockList(kinds, address, mask, words='w'):
+    ''' Return the blocks [start, end, type] of the runs of data in kinds, with words
+        the type of WORDS '''
+    blocks = []
+    edges = numpy.flatnonzero(numpy.diff(kinds)) + 1
+    for start, stop in zip(numpy.concatenate(([0], edges)), numpy.concatenate((edges, [len(kinds)]))):
+        if kinds[start] != CODE:
+            blocks.append([(address + int(start)) & mask, (address + int(stop) - 1) & mask, TYPES[kinds[start]] if kinds[start] != WORDS else words])
+    return blocks
+
+
+def classify(dis, image, address, window=WINDOW, minString=MINSTRING, minFill=MINFILL, strings=False):
+    ''' Return the blocks [start, end, type] of the data found in image (bytes) loaded
+        at address, for the CPU and character set of dis (whose blocks are replaced);
+        with strings only those of the strings '''
+    img = numpy.frombuffer(bytes(image), numpy.uint8)
+    size = len(img)
+    kinds = numpy.zeros(size, numpy.uint8)
+    if size == 0:
+        return []
+    keys = stats.OpcodeKeys(dis)
+    words = 'W' if dis.bigEndian else 'w'
+
+    # Fill, text and tables, with the instructions of the image without blocks
+    if strings:
+        textRuns(image, kinds, dis.charset, minString)
+        return blockList(kinds, address, dis.addressMask)
+    kinds[fillRuns(img, minFill)] = BYTES
+    textRuns(image, kinds, dis.charset, minString)
+    dis.setBlocks([])
+    isStart = numpy.zeros(size, bool)
+    isStart[stats.decodeArrays(dis, img, address, keys)[0]] = True
+    wordTables(dis, img, address, kinds, isStart)
+
+    # The instructions with those blocks
+    dis.setBlocks(blockList(kinds, address, dis.addressMask, words))
+    starts, key = stats.decodeArrays(dis, img, address, keys)[:2]
+    isStart[:] = False
+    isStart[starts] = True
+    invalid = numpy.array([info[1] is None for info in keys.info])[key]
+    undocumented = numpy.array([bool(info[3] & und) for info in keys.info])[key]
+    branches = starts[(numpy.array([info[3] & (pcr | jump | call) for info in keys.info])[key] != 0) & ~invalid]
+
+    count = numpy.zeros(size)
+    count[starts] = 1
+    bad = numpy.zeros(size)
+    bad[starts] = invalid + 0.5 * undocumented
+    branchCount = numpy.zeros(size)
+    badBranch = numpy.zeros(size)
+    mask = dis.addressMask
+    for pos in branches.tolist():
+        target = dis.decodeInstruction(image, pos, (address + pos) & mask).target
+        if target is not None:
+            offset = (target - address) & mask
+            if offset < size:
+                branchCount[pos] = 1
+                badBranch[pos] = not isStart[offset]
+
+    instructions = numpy.maximum(windowSum(count, window), 1)
+    branched = windowSum(branchCount, BRANCHWINDOWS * window)
+    isData = ((windowSum(bad, window) > MAXINVALID * instructions) |
+              ((branched >= MINBRANCHES) & (windowSum(badBranch, BRANCHWINDOWS * window) > MAXBADBRANCH * branched)) |
+              (entropy(img, ENTROPYWINDOW) < MINENTROPY))
+    isData &= kinds == CODE
+
+    # The windows make the data start too early or late: it starts after the last
+    # instruction ending the code (like a return or jump) before the first invalid
+    # opcode, if there is one in the window
+    finals = numpy.array([bool(info[3] & final) for info in keys.info])[key]
+    afterFinal = starts[1:][finals[:-1]]
+    invalidStarts = starts[invalid]
+    first, stop = runs(isData)
+    for start, end in zip(first.tolist(), stop.tolist()):
+        i = numpy.searchsorted(invalidStarts, start)
+        j = numpy.searchsorted(afterFinal, invalidStarts[i], "right") - 1 if i < len(invalidStarts) else -1
+        if j >= 0 and start - window <= afterFinal[j] < end:
+            isData[start:afterFinal[j]] = False
+            isData[afterFinal[j]:start] = kinds[afterFinal[j]:start] == CODE
+    kinds[isData] = BYTES
+
+    # Short pieces of code between data
+    first, stop = runs(kinds == CODE)
+    short = (stop - first < window) & (first > 0) & (stop < size)
+    for start, end in zip(first[short], stop[short]):
+        kinds[start:end] = BYTES
+    return blockList(kinds, address, mask, words)
+
+
+def writeBlocks(blocks, outfd, digits=4):
+    ''' Write blocks in the format of a block file '''
+    for start, end, btype in blocks:
+        outfd.write("0x{0:0{3}X}, 0x{1:0{3}X}, {2}\n".format(start, end, btype, digits))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="udis.py classify", description="Guess the data blocks of an image and write them as a block file")
+    parser.add_argument("filename", help="Binary file to classify")
+    parser.add_argument("-c", "--cpu", help="Specify CPU type (defaults to 6502)", default="6502")
+    parser.add_argument("-a", "--address", help="Specify decimal starting address (defaults to 0)", default="0")
+    parser.add_argument("-u", "--undocumented", help="Allow undocumented opcodes", action="store_true")
+    parser.add_argument("-t", "--type", help="File type: " + ", ".join(loader.FORMATS) + " (defaults to the type of the file name extension, or raw)", choices=loader.FORMATS)
+    parser.add_argument("--charset", help="Character set of the strings: " + ", ".join(charset.CHARSETS) + " (defaults to ascii)",
+                        choices=charset.CHARSETS, default="ascii")
+    parser.add_argument("--strings", help="Only find the strings", action="store_true")
+    parser.add_argument("-o", "--output", help="Write the block file to this file instead of standard output", default="")
+    parser.add_argument("--window", help="Number of bytes around each offset scored together (defaults to {})".format(WINDOW), type=int, default=WINDOW)
+    parser.add_argument("--min-string", help="Minimum length of a string (defaults to {})".format(MINSTRING), type=int, default=MINSTRING)
+    parser.add_argument("--min-fill", help="Minimum length of a run of fill bytes (defaults to {})".format(MINFILL), type=int, default=MINFILL)
+    args = parser.parse_args(argv)
+
+    if numpy is None:
+        print("error: classify needs NumPy", file=sys.stderr)
+        return 1
+    try:
+        dis = Disassembler(args.cpu, undocumented=args.undocumented, charset=args.charset)
+        image = readImage(args.filename, args.type)
+    except FileNotFoundError as error:
+        print("error: file '{}' not found.".format(error.filename), file=sys.stderr)
+        return 1
+    except ValueError as error:
+        print("error: {}".format(error), file=sys.stderr)
+        return 1
+
+    if isinstance(image, SegmentMap):
+        blocks = [block for base, data in image for block in classify(dis, data, base, args.window, args.min_string, args.min_fill, args.strings)]
+    else:
+        blocks = classify(dis, image, parseAddress(args.address), args.window, args.min_string, args.min_fill, args.strings)
+    digits = max(4, len("{0:X}".format(dis.addressMask)))
+    if args.output:
+        with open(args.output, "w") as outfd:
+            writeBlocks(blocks, outfd, digits)
+    else:
+        writeBlocks(blocks, sys.stdout, digits)
+
+    sizes = {}
+    for start, end, btype in blocks:
+        sizes[btype] = sizes.get(btype, 0) + ((end - start) & dis.addressMask) + 1
+    print("{0} blocks".format(len(blocks)) + "".join(", {0} {1} bytes".format(btype, sizes[btype]) for btype in TYPES + "W" if btype in sizes),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,756 @@
+''' Universal Disassembler library
+
+Usage:
+    dis = Disassembler("6502", nolist=True)
+    dis.readBlocks("basicblock.txt")
+    for line in dis.disassemble(image, 0xC000):
+        print(line)
+
+Decoding and formatting are separate passes: decode() yields Instruction
+records, formatListing() turns records into output lines.
+
+A Disassembler can be reused for any number of images; the CPU plugin is
+only executed once per process (see loadPlugin).
+'''
+
+import os
+import re
+import struct
+
+import block
+import label
+from charset import asciiText, stringText
+
+# Flags
+pcr = 1
+und = 2
+z80bit = 4
+# Flow control flags, from the lists in the plugin
+jump = 8
+call = 16
+final = 32
+# Memory reference flag, from the list in the plugin
+write = 64
+
+# Known value of the carry in the status bits of register width tracking
+CARRYSET = 0x100
+CARRYCLEAR = 0x200
+# Emulation mode (65816 E flag), in which the width flags are always set
+EMULATION = 0x400
+
+# Plugins are searched for in the same directory as this module.
+PLUGINDIR = os.path.dirname(os.path.realpath(__file__))
+CPUS = "1802 6502 65816 65c02 6800 6801/6803 6809 6811 8051 8080 8085 z80"
+
+_plugins = {}
+_tables = {}
+
+
+def isprint(char):
+    "Return if character is printable ASCII 0x20 up to 0x7F"
+    return ' ' <= char <= '~'
+
+
+# Text of each byte value in data directives
+HEXBYTE = ["{0:02X} ".format(b) for b in range(256)]
+BYTETEXT = ["${0:02X}".format(b) for b in range(256)]
+DIRECTIVES = {'a': ".ascii", 'b': ".byte", 'W': ".dw", 'w': ".word", 's': ".string"}
+
+
+class Instruction:
+    ''' One decoded instruction, data directive (.byte, .ascii, .dw, .word, .string)
+        or listing directive (.org, end).
+        address  - address of the first byte
+        data     - raw bytes
+        mnemonic - mnemonic, "???" for an invalid opcode, or the directive
+        mode     - addressing mode, or block type ('a', 'b', 'W', 'w', 's') for data
+                   (data directives are told apart by their mnemonic, not the mode)
+        operands - operand bytes after the opcode; the value(s) for data directives
+        flags    - flags from the opcode table
+        target   - resolved pc relative or jump address, or None '''
+
+    __slots__ = ("address", "data", "mnemonic", "mode", "operands", "flags", "target")
+
+    def __init__(self, address, data, mnemonic, mode=None, operands=(), flags=0, target=None):
+        self.address = address
+        self.data = data
+        self.mnemonic = mnemonic
+        self.mode = mode
+        self.operands = operands
+        self.flags = flags
+        self.target = target
+
+    def __repr__(self):
+        return "Instruction(${0:04X}, {1}, {2!r}, {3!r}, {4!r})".format(
+            self.address, self.data.hex(), self.mnemonic, self.mode, self.operands)
+
+
+def loadPlugin(cpu):
+    ''' Execute the CPU plugin file and return its namespace (cached per cpu).
+        Raises FileNotFoundError if there is no plugin for cpu '''
+    if cpu not in _plugins:
+        plugin = PLUGINDIR + os.sep + cpu + ".py"
+        namespace = {"pcr": pcr, "und": und, "z80bit": z80bit, "labels": False, "bigEndian": False,
+                     "jumpInstructions": [], "callInstructions": [], "finalInstructions": [],
+                     "writeInstructions": [], "pointerModes": [], "vectors": [], "entryPoints": [],
+                     "addressWidth": 16, "widthFlags": 0, "wideImmediates": {}, "wideMode": "",
+                     "statusInstructions": {}}
+        with open(plugin) as pfd:
+            exec(pfd.read(), namespace)
+        _plugins[cpu] = namespace
+    return _plugins[cpu]
+
+
+class DecodeTables:
+    ''' Decode tables compiled from a CPU plugin (see compileTables).
+        decodeTable     - 256 entries indexed by the first opcode byte. An entry is a
+                          tuple (length, mnemonic, mode, flags) or None for an invalid
+                          opcode; the entry of a leadin byte is a 256-entry list for the
+                          second byte in the same format
+        bitTables       - maps the 2-byte opcode of z80bit placeholders to a 256-entry
+                          list indexed by the last byte of the instruction
+        operandFormats  - maps each addressing mode to its bound format method (for
+                          plugins with labels, to the list of format strings)
+        addressFields   - maps each addressing mode whose operand is an address to the
+                          indices of its operand bytes, most significant first
+        longRelative    - maps each addressing mode with a 16-bit pc relative displacement
+                          to the indices of its operand bytes, most significant first
+        labelFormats    - maps each addressing mode with a jump or pc relative target to
+                          the bound format method of the operand with the target given as
+                          keyword label (only for plugins without labels)
+        referenceFields - maps each addressing mode with an absolute address anywhere in
+                          its operand (like "(${1:02X}{0:02X}),y") to the indices of its
+                          operand bytes, most significant first '''
+
+    def __init__(self, decodeTable, bitTables, operandFormats, addressFields, longRelative, labelFormats,
+                 referenceFields):
+        self.decodeTable = decodeTable
+        self.bitTables = bitTables
+        self.operandFormats = operandFormats
+        self.addressFields = addressFields
+        self.longRelative = longRelative
+        self.labelFormats = labelFormats
+        self.referenceFields = referenceFields
+
+
+# Operand format that is only an address, e.g. "${1:02X}{0:02X}" or "nz,${1:02X}{0:02X}"
+ADDRESSFORMAT = re.compile(r"^(?:[a-z]+,)?\$((?:\{\d:02X\}){2,3})$")
+# Absolute address in an operand format
+REFERENCEFORMAT = re.compile(r"\$((?:\{\d:02X\}){2,3})")
+# Pc relative target in an operand format, e.g. "${0:04X}"
+TARGETFORMAT = re.compile(r"\$\{\d:04X\}")
+
+
+def compileTables(cpu, undocumented=False):
+    ''' Return the DecodeTables for cpu (cached per cpu and undocumented option).
+        Undocumented opcodes are invalid unless undocumented is set. The flow control
+        lists of the plugin are added to the flags as jump, call and final, and the
+        writeInstructions as write. '''
+    key = (cpu, bool(undocumented))
+    if key not in _tables:
+        plugin = loadPlugin(cpu)
+        opcodeTable = plugin["opcodeTable"]
+        addressModeTable = plugin["addressModeTable"]
+        labels = plugin["labels"]
+
+        def compileEntry(opcode):
+            if opcode not in opcodeTable:
+                return None
+            entry = opcodeTable[opcode]
+            mnemonic = entry[1]
+            flags = entry[3] if len(entry) > 3 else 0
+            if entry[2] not in addressModeTable:
+                raise ValueError("mode '{}' not found in addressModeTable.".format(entry[2]))
+            if flags & und and not undocumented:
+                return None
+            if mnemonic in plugin["jumpInstructions"] or opcode in plugin["jumpInstructions"]:
+                flags |= jump
+            if mnemonic in plugin["callInstructions"] or opcode in plugin["callInstructions"]:
+                flags |= call
+            if mnemonic in plugin["finalInstructions"] or opcode in plugin["finalInstructions"]:
+                flags |= final
+            if mnemonic in plugin["writeInstructions"] or opcode in plugin["writeInstructions"]:
+                flags |= write
+            return (entry[0], mnemonic, entry[2], flags)
+
+        decodeTable = []
+        bitTables = {}
+        for first in range(256):
+            if first in plugin["leadInBytes"]:
+                decodeTable.append([compileEntry((first << 8) + second) for second in range(256)])
+            else:
+                decodeTable.append(compileEntry(first))
+        for opcode, entry in opcodeTable.items():
+            if len(entry) > 3 and entry[3] & z80bit:
+                bitTables[opcode] = [compileEntry((opcode << 16) + last) for last in range(256)]
+
+        if labels:
+            operandFormats = dict(addressModeTable)
+        else:
+            operandFormats = {mode: fmt.format for mode, fmt in addressModeTable.items()}
+
+        addressFields = {}
+        referenceFields = {}
+        for mode, fmt in addressModeTable.items():
+            fmt = fmt[0] if labels else fmt
+            match = ADDRESSFORMAT.match(fmt)
+            if match:
+                addressFields[mode] = tuple(int(field[1]) for field in match.group(1).split("}")[:-1])
+            match = REFERENCEFORMAT.search(fmt)
+            if match:
+                referenceFields[mode] = tuple(int(field[1]) for field in match.group(1).split("}")[:-1])
+
+        labelFormats = {}
+        if not labels:
+            for mode in addressFields:
+                # Replace the address, including its "$"
+                match = ADDRESSFORMAT.match(addressModeTable[mode])
+                labelFormats[mode] = (match.string[:match.start(1) - 1] + "{label}").format
+
+        # A pc relative operand of two bytes shown as one value is a 16-bit displacement
+        longRelative = set()
+        for opcode, entry in opcodeTable.items():
+            if len(entry) > 3 and entry[3] & pcr:
+                operandBytes = entry[0] - (2 if opcode > 0xff else 1)
+                fmt = addressModeTable[entry[2]]
+                fmt = fmt[0] if labels else fmt
+                if operandBytes == 2 and fmt.count("{") == 1:
+                    longRelative.add(entry[2])
+                if not labels:
+                    # The target is the last value in the operand
+                    fields = list(TARGETFORMAT.finditer(fmt))
+                    if fields:
+                        fmt = fmt[:fields[-1].start()] + "{label}" + fmt[fields[-1].end():]
+                        labelFormats[entry[2]] = fmt.format
+        if plugin["bigEndian"]:
+            longRelative = {mode: (0, 1) for mode in longRelative}
+        else:
+            longRelative = {mode: (1, 0) for mode in longRelative}
+
+        _tables[key] = DecodeTables(decodeTable, bitTables, operandFormats, addressFields, longRelative, labelFormats,
+                                    referenceFields)
+    return _tables[key]
+
+
+class Disassembler:
+    ''' Disassembler for one CPU type with fixed output options '''
+
+    def __init__(self, cpu="6502", nolist=False, undocumented=False, invalid=False, perLine=1, charset="ascii"):
+        plugin = loadPlugin(cpu)
+        self.cpu = cpu
+        self.nolist = nolist
+        self.perLine = max(perLine, 1)      # items per .byte/.ascii/.word/.dw line
+        self.charset = charset              # character set of .ascii and .string data
+        self.asciiText = asciiText(charset)
+        self.stringText = stringText(charset)
+        self.undocumented = undocumented
+        self.invalid = invalid
+        self.leadInBytes = plugin["leadInBytes"]
+        self.opcodeTable = plugin["opcodeTable"]
+        self.addressModeTable = plugin["addressModeTable"]
+        tables = compileTables(cpu, undocumented)
+        self.decodeTable = tables.decodeTable
+        self.bitTables = tables.bitTables
+        self.operandFormats = tables.operandFormats
+        self.addressFields = tables.addressFields
+        self.longRelative = tables.longRelative
+        self.labelFormats = tables.labelFormats
+        self.referenceFields = tables.referenceFields
+        self.pointerModes = plugin["pointerModes"]
+        self.maxLength = plugin["maxLength"]
+        self.addressWidth = plugin["addressWidth"]
+        self.addressMask = (1 << self.addressWidth) - 1
+        self.addressDigits = 4      # hex digits of addresses in the listing, see setAddressDigits
+        self.bigEndian = plugin["bigEndian"]
+        self.vectors = plugin["vectors"]
+        self.entryPoints = plugin["entryPoints"]
+        self.labels = plugin["labels"]
+        self.blocks = block.BlockMap()
+        self.labellist = []
+        self.labelindex = {}
+        self.comments = {}      # address -> comment lines shown before the instruction
+
+        # Register width tracking (65816 m and x flags), see decode
+        self.widthFlags = plugin["widthFlags"]
+        self.wideImmediates = plugin["wideImmediates"]
+        self.statusInstructions = plugin["statusInstructions"]
+        # Status after reset; a CPU which switches modes with the carry starts in emulation mode
+        self.resetStatus = self.widthFlags | (EMULATION if "exchangecarry" in self.statusInstructions.values() else 0)
+        self.wideEntries = {}
+        for opcode in self.wideImmediates:
+            entry = self.decodeTable[opcode]
+            if entry is not None:
+                self.wideEntries[opcode] = (entry[0] + 1, entry[1], plugin["wideMode"], entry[3])
+        self.statusAt = {}      # address -> status bits, from setStatus and flow analysis
+
+        self.dataLines = None   # complete lines of a single .byte and .ascii, see formatListing
+
+    def setAddressDigits(self, lastAddress):
+        ''' Set the number of hex digits of addresses in the listing for an image ending at
+            lastAddress: 4 up to $FFFF, otherwise as many as the address width needs '''
+        if lastAddress > 0xffff:
+            self.addressDigits = (self.addressWidth + 3) // 4
+        else:
+            self.addressDigits = 4
+
+    def setStatus(self, address, text):
+        ''' Set the register width flags at address from text with a digit for each flag
+            (for the 65816 "mx": 1 for 8-bit, 0 for 16-bit registers), in native mode '''
+        bits = [1 << i for i in range(15, -1, -1) if self.widthFlags & (1 << i)]
+        if not bits or len(text) != len(bits) or text.strip("01"):
+            raise ValueError("invalid register width flags '{}' for {}".format(text, self.cpu))
+        self.statusAt[address] = sum(bit for bit, digit in zip(bits, text) if digit == "1")
+
+    def nextStatus(self, ins, status):
+        ''' Return the status bits after instruction ins, from the status before it.
+            The carry is only known directly after an instruction which sets or clears it,
+            which is enough for "clc; xce" and "sec; xce". In emulation mode the width
+            flags stay set. '''
+        action = self.statusInstructions.get(ins.mnemonic)
+        carry = 0
+        if action == "clear":
+            if not status & EMULATION:
+                status &= ~(ins.operands[0] & self.widthFlags)
+            if ins.operands[0] & 1:
+                carry = CARRYCLEAR
+        elif action == "set":
+            status |= ins.operands[0] & self.widthFlags
+            if ins.operands[0] & 1:
+                carry = CARRYSET
+        elif action == "clearcarry":
+            carry = CARRYCLEAR
+        elif action == "setcarry":
+            carry = CARRYSET
+        elif action == "exchangecarry" and status & CARRYSET:
+            status |= self.widthFlags | EMULATION
+        elif action == "exchangecarry" and status & CARRYCLEAR:
+            status &= ~EMULATION
+        return (status & ~(CARRYSET | CARRYCLEAR)) | carry
+
+    def trackStatus(self, records, status=None):
+        ''' Generator for (status, record) for a sequence of Instruction records from
+            decode: the register width status before each record, from status at the
+            first one (defaults to the flags after reset) '''
+        statusAt = self.statusAt
+        if status is None:
+            status = self.resetStatus
+        for ins in records:
+            if ins.mnemonic[0] != "." and ins.mnemonic != "end":
+                status = statusAt.get(ins.address, status)
+                yield status, ins
+                status = self.nextStatus(ins, status)
+            else:
+                yield status, ins
+
+    def readBlocks(self, filename):
+        ''' Use the byte/word/string block information from filename '''
+        self.setBlocks(block.readBlocks(filename))
+
+    def setBlocks(self, blocks):
+        ''' Use the blocks from a list of [start, end, type] '''
+        self.blocks = block.BlockMap(blocks)
+
+    def readLabels(self, filename):
+        ''' Use the labels from the '.lbl' file belonging to binary filename '''
+        self.readLabelFile(label.labelFile(filename))
+
+    def readLabelFile(self, filename):
+        ''' Use the labels from the label file filename '''
+        self.labellist = []
+        if self.labels:
+            label.readLabelFile(filename, self.labellist)
+        self.labelindex = label.indexLabels(self.labellist)
+
+    def addTargetLabels(self, image, address=0):
+        ''' Add a label sub_XXXX for each call target and L_XXXX for each other branch or
+            jump target in image (loaded at address). Only targets where an instruction
+            or data value starts get a label; addresses with a label keep it. '''
+        self.setAddressDigits((address & self.addressMask) + len(image) - 1)
+        self.setTargetLabels(*self.findTargets(self.decode(image, address)))
+
+    def findTargets(self, records):
+        ''' Return (starts, targets) of a sequence of Instruction records: the set of
+            addresses where an instruction or data value starts, and a dict of the branch
+            and jump targets to whether the target is called '''
+        starts = set()
+        targets = {}
+        for ins in records:
+            mnemonic = ins.mnemonic
+            if mnemonic == ".byte" or mnemonic == ".ascii":
+                starts.update(range(ins.address, ins.address + len(ins.data)))
+            elif mnemonic == ".word" or mnemonic == ".dw":
+                starts.update(range(ins.address, ins.address + len(ins.data), 2))
+            else:
+                starts.add(ins.address)
+            if ins.target is not None and not targets.get(ins.target):
+                targets[ins.target] = ins.flags & call
+        return starts, targets
+
+    def setTargetLabels(self, starts, targets):
+        ''' Add the labels for targets found by findTargets (see addTargetLabels), with
+            addressDigits hex digits '''
+        name = ("{0}_{1:0%dX}" % self.addressDigits).format
+        for target, iscall in targets.items():
+            if target in starts and target not in self.labelindex:
+                self.labelindex[target] = [name("sub" if iscall else "L", target)]
+
+    def disassembleFile(self, filename, address=0):
+        ''' Generator for the output lines of binary file filename '''
+        with open(filename, "rb") as f:
+            image = f.read()
+        return self.disassemble(image, address)
+
+    def disassemble(self, image, address=0):
+        ''' Generator for the output lines of image (bytes-like) loaded at address '''
+        self.setAddressDigits((address & self.addressMask) + len(image) - 1)
+        return self.formatListing(self.decode(image, address))
+
+    def disassembleSegments(self, segments):
+        ''' Generator for the output lines of a memory.SegmentMap, with an .org for
+            each segment '''
+        self.setAddressDigits(segments.lastAddress())
+        return self.formatListing(self.decodeSegments(segments))
+
+    def decodeSegments(self, segments):
+        ''' Generator for the Instruction records of all segments of a memory.SegmentMap;
+            only the last segment ends with an end record '''
+        last = len(segments) - 1
+        for i, (base, data) in enumerate(segments):
+            for ins in self.decode(data, base):
+                if ins.mnemonic != "end" or i == last:
+                    yield ins
+
+    def decode(self, image, address=0, start=0, stop=None, status=None):
+        ''' Generator for the Instruction records of image (bytes-like) loaded at address.
+            The first record is the .org directive; "end" is only given when the image
+            does not end in the middle of an instruction or word.
+            With start and stop only the records from offset start in image up to offset
+            stop are given (.org only if start is 0, end only if stop is the end of
+            image); both must be offsets where decoding the whole image has a record
+            boundary (see parallel.py).
+            For a CPU with register width tracking status gives the status bits at the
+            start (defaults to the flags after reset); the status set for an address in
+            statusAt (by setStatus or flow analysis) is used there. '''
+        # Variables:
+        # address - current instruction address
+        # pos - offset of the current instruction in image
+        # length - length of current data block
+        blocks = self.blocks
+
+        image = bytes(image)
+        imageEnd = len(image)
+        if stop is None:
+            stop = imageEnd
+        pos = start
+        addressMask = self.addressMask
+        address = (address + start) & addressMask
+
+        if start == 0:
+            yield Instruction(address, b"", ".org", operands=(address,))
+
+        tracking = bool(self.wideEntries)
+        statusAt = self.statusAt
+        if status is None:
+            status = self.resetStatus
+
+        # The blocks are only looked up again when address leaves low..high
+        low = high = -1
+
+        while True:
+            if not low <= address <= high:
+                current, low, high = blocks.lookup(address)
+                if current is not None and current[2] in "abWws":
+                    end = current[1]
+                    btype = current[2]
+                    if btype == 'a' or btype == 'b':
+                        length = min(end - address + 1, imageEnd - pos)
+                        values = image[pos:pos + length]
+                        yield from self.dataRecords(image, pos, address, values, 1, btype)
+                        pos += length
+                        address += length
+
+                    elif btype == 'W' or btype == 'w':
+                        # A word may end after the block end, as the last byte of a block
+                        # with an odd length starts a word
+                        count = min((end - address) // 2 + 1, (imageEnd - pos) // 2)
+                        wordformat = (">" if btype == 'W' else "<") + str(count) + "H"
+                        values = struct.unpack_from(wordformat, image, pos)
+                        yield from self.dataRecords(image, pos, address, values, 2, btype)
+                        pos += 2 * count
+                        address += 2 * count
+
+                    elif btype == 's':
+                        length = min(end - address + 1, imageEnd - pos)
+                        data = image[pos:pos + length]
+                        if data:
+                            yield Instruction(address, data, ".string", btype, data)
+                        pos += length
+                        address += length
+
+                    if address <= end:
+                        return           # unexpected EOF
+                    address &= addressMask
+                    low = high = -1
+                    continue
+
+            if pos >= stop:
+                if pos >= imageEnd:  # handle EOF
+                    yield Instruction(address, b"", "end")
+                return
+
+            if tracking:
+                status = statusAt.get(address, status)
+                ins = self.decodeInstruction(image, pos, address, status)
+                if ins is None:     # Unexpected EOF
+                    return
+                status = self.nextStatus(ins, status)
+            else:
+                ins = self.decodeInstruction(image, pos, address)
+                if ins is None:     # Unexpected EOF
+                    return
+            yield ins
+            pos += len(ins.data)
+
+            # Update address, handlng wraparound at the end of the address space.
+            address = (address + len(ins.data)) & addressMask
+
+    def decodeInstruction(self, image, pos, address, status=None):
+        ''' Return the Instruction at offset pos of image (bytes) for the given address,
+            or None if the image ends within the instruction. Data blocks are not
+            taken into account. status gives the register width flags, if tracked. '''
+        # Look up the opcode; a list is the table for a leadin byte
+        entry = self.decodeTable[image[pos]]
+        if entry.__class__ is list:
+            if pos + 1 >= len(image):
+                return None
+            entry = entry[image[pos + 1]]
+            leadin = True
+        else:
+            leadin = False
+            if status is not None and image[pos] in self.wideEntries and not status & self.wideImmediates[image[pos]]:
+                entry = self.wideEntries[image[pos]]
+
+        if entry is None:
+            # Invalid opcode
+            length = 2 if leadin else 1
+            if pos + length > len(image):
+                return None
+            return Instruction(address, image[pos:pos + length], "???")
+
+        length, mnemonic, mode, flags = entry
+
+        # Get any operands
+        if pos + length > len(image):
+            return None
+        data = image[pos:pos + length]
+        operands = tuple(data[2:] if leadin else data[1:])
+        target = None
+
+        if flags & z80bit:
+            # 4 byte ix/iy bit instruction: the last byte selects the real opcode
+            length, mnemonic, mode, flags = self.bitTables[(data[0] << 8) + data[1]][operands[1]]
+            operands = operands[:1]
+
+        # Handle relative addresses. Indicated by the flag pcr being set.
+        # Assumes the operand that needs to be PC relative is the last one.
+        # With addresses wider than 16 bits the target is in the same 64K bank.
+        if flags & pcr:
+            if mode in self.longRelative:
+                high, low = self.longRelative[mode]
+                offset = (operands[high] << 8) + operands[low]
+                if offset >= 32768:
+                    offset -= 65536
+                target = (address & ~0xffff) | ((address + length + offset) & 0xffff)
+            elif self.addressWidth > 16:
+                offset = operands[-1] - 256 if operands[-1] >= 128 else operands[-1]
+                target = (address & ~0xffff) | ((address + length + offset) & 0xffff)
+            else:
+                if operands[-1] < 128:
+                    target = address + operands[-1] + length
+                else:
+                    target = address - (256 - operands[-1]) + length
+                if target < 0:
+                    target += 65536
+        elif flags & jump and mode in self.addressFields:
+            target = 0
+            for i in self.addressFields[mode]:
+                target = (target << 8) + operands[i]
+            if len(self.addressFields[mode]) == 2:
+                target |= address & ~0xffff     # 16-bit address in the current bank
+
+        return Instruction(address, data, mnemonic, mode, operands, flags, target)
+
+    def dataRecords(self, image, pos, address, values, size, btype):
+        ''' Generator for the data directive records of values (from image at pos,
+            size bytes each) with perLine values per record. A record does not run
+            over a labelled address. '''
+        mnemonic = DIRECTIVES[btype]
+        perLine = self.perLine
+        count = len(values)
+        if perLine == 1:
+            for i in range(count):
+                p = pos + i * size
+                yield Instruction(address + i * size, image[p:p + size], mnemonic, btype, (values[i],))
+            return
+        labelindex = self.labelindex
+        i = 0
+        while i < count:
+            n = 1
+            while n < perLine and i + n < count and address + (i + n) * size not in labelindex:
+                n += 1
+            p = pos + i * size
+            yield Instruction(address + i * size, image[p:p + n * size], mnemonic, btype, tuple(values[i:i + n]))
+            i += n
+
+    def operandAddress(self, ins):
+        ''' Return the address in the operand of ins which formatOperand shows as a label
+            if it has one, or None '''
+        if ins.target is not None:
+            return ins.target
+        if self.labels and len(ins.operands) == 2 and ins.mnemonic[0] != "." and ins.mnemonic != "???":
+            return ins.operands[0] + 256 * ins.operands[1]
+        return None
+
+    def formatOperand(self, instruction):
+        ''' Return the operand text of a decoded instruction '''
+        opcodeformat = self.operandFormats[instruction.mode]
+        ops = instruction.operands
+        relative = instruction.flags & pcr
+        if relative:
+            if instruction.mode in self.longRelative:
+                ops = (instruction.target,)
+            else:
+                ops = ops[:-1] + (instruction.target,)
+        if self.labels:
+            if not ops:
+                return opcodeformat[0]
+            if relative:
+                return label.getFullLabelrel(self.labelindex, opcodeformat, instruction.target)
+            if len(ops) == 2:
+                return label.getFullLabelstring(self.labelindex, opcodeformat, ops[0], ops[1])
+            return opcodeformat[0].format(*ops)
+        if not ops:
+            return self.addressModeTable[instruction.mode]
+        if instruction.target in self.labelindex and instruction.mode in self.labelFormats:
+            return self.labelFormats[instruction.mode](*ops, label=self.labelindex[instruction.target][0])
+        if relative and instruction.target > 0xffff and instruction.mode in self.labelFormats:
+            # Target outside bank 0, with all digits of the address width
+            return self.labelFormats[instruction.mode](*ops, label="${0:0{1}X}".format(instruction.target, self.addressDigits))
+        return opcodeformat(*ops)
+
+    def formatListing(self, records):
+        ''' Generator for the output lines of a sequence of Instruction records '''
+        # Disassembly format:
+        # XXXX  XX XX XX XX XX  nop    ($1234,X)
+        # With --nolist option:
+        # nop    ($1234,X)
+        nolist = self.nolist
+        maxLength = self.maxLength
+        leadInBytes = self.leadInBytes
+        labelindex = self.labelindex
+        comments = self.comments
+        addressText = ("{0:0%dX}" % self.addressDigits).format
+        s = "                          "
+
+        asciiChars = self.asciiText
+        stringChars = self.stringText
+
+        # Complete text after the address of a single .byte or .ascii
+        if self.dataLines is None:
+            if nolist is False:
+                self.dataLines = ([HEXBYTE[b] + "   " * (maxLength - 1) + "   .byte    " + BYTETEXT[b] for b in range(256)],
+                                  [HEXBYTE[b] + "   " * (maxLength - 1) + "   .ascii   " + asciiChars[b] for b in range(256)])
+            else:
+                self.dataLines = (["   .byte    " + BYTETEXT[b] for b in range(256)],
+                                  ["   .ascii   " + asciiChars[b] for b in range(256)])
+        byteLines, asciiLines = self.dataLines
+
+        for ins in records:
+            address = ins.address
+            data = ins.data
+            mnemonic = ins.mnemonic
+            if mnemonic == ".org":
+                if nolist is False:
+                    yield addressText(address) + s[0:maxLength*3+3] + "  .org     $" + addressText(address) + "\n"
+                else:
+                    yield "   .org     $" + addressText(address) + "\n"
+                continue
+
+            if address in labelindex:
+                yield from label.getPCLabels(address, labelindex)
+            if comments and address in comments:
+                yield from comments[address]
+
+            if mnemonic == "end":
+                if nolist is False:
+                    yield "\n" + addressText(address) + s[0:maxLength*3+3] + "  end"
+                else:
+                    yield "\n   end"
+                continue
+
+            line = ""
+            if mnemonic[0] == ".":
+                # Data directive
+                values = ins.operands
+                if len(data) == 1 and mnemonic != ".string":
+                    lines = byteLines if mnemonic == ".byte" else asciiLines
+                    if nolist is False:
+                        yield addressText(address) + "  " + lines[data[0]]
+                    else:
+                        yield lines[data[0]]
+                    continue
+                if nolist is False:
+                    line = addressText(address) + "  " + "".join([HEXBYTE[b] for b in data[:maxLength]])
+                    line += "   " * (maxLength - len(data))
+                if mnemonic == ".byte":
+                    line += "   .byte    " + ",".join([BYTETEXT[b] for b in values])
+                elif mnemonic == ".ascii":
+                    line += "   .ascii   " + ",".join([asciiChars[b] for b in values])
+                elif mnemonic == ".string":
+                    line += "   .string  '" + "".join([stringChars[b] for b in data]) + "'"
+                elif len(values) == 1:
+                    line += "   {0:8s} ${1:04X}".format(mnemonic, values[0])
+                else:
+                    line += "   {0:8s} ".format(mnemonic) + ",".join(["${0:04X}".format(w) for w in values])
+                yield line
+                continue
+
+            leadin = len(data) > 1 and data[0] in leadInBytes
+
+            # Add current address and instruction bytes to output line
+            if nolist is False:
+                line += addressText(address) + " "
+                for b in data:
+                    line += " {0:02X}".format(b)
+                if leadin is False:
+                    line += "   " * (maxLength - len(data))
+
+            if mnemonic == "???":
+                operand = ""
+                # Special check for invalid op code. Display as ??? or .byte depending on command line option.
+                if not self.invalid:
+                    # Handle case where invalid opcode has a leadin byte.
+                    if leadin is True:
+                        if nolist is False:
+                            mnemonic = "{0:s}.byte    ${1:02X},${2:02X}".format(s[0:(maxLength-2)*3], data[0], data[1])
+                        else:
+                            mnemonic = ".byte    ${0:02X},${1:02X}".format(data[0], data[1])
+                    else:
+                        if isprint(chr(data[0])):
+                            mnemonic = ".byte    '{0:c}'".format(data[0])
+                        else:
+                            mnemonic = ".byte    ${0:02X}".format(data[0])
+            else:
+                operand = self.formatOperand(ins)
+
+            # Need one more space if not in no list mode.
+            if nolist is False:
+                line += " "
+
+            # Add mnemonic and any operands to the output line.
+            if operand == "":
+                line += "   {0:s}".format(mnemonic)
+            else:
+                line += "   {0:5s}    {1:s}".format(mnemonic, operand)
+
+            yield line
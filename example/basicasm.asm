@@ -1482,7 +1482,7 @@ breakroutine:
    lda      $11
    sta      $06
    jmp      BreakCommand
-   .string  '@=1;P.$6$7'"ERROR "?0;@=8;IF?1|?2P." LINE"!1& #FFFF\x0d\x00\x00P.';E.\x0d'
+   .string  '@=1;P.$6$7\'"ERROR "?0;@=8;IF?1|?2P." LINE"!1& #FFFF\x0d\x00\x00P.\';E.\x0d'
    jsr      CheckExtent
    bcc      $CA1B
    jmp      (ExtentValExpr)
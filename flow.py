@@ -0,0 +1,109 @@
+''' recursive descent: follow the flow of control from entry points to tell code from data
+
+Starting at each entry address, instructions are decoded until an invalid opcode,
+an instruction that does not continue (jmp, rts, ...), a data block or code that
+was already visited. The targets of branches, jumps and calls are followed as
+well. Jumps through a register or memory (jmp ($1234), jp (hl), ...) have no
+known target and are not followed.
+
+For a CPU with register width tracking (65816) the status at each entry is taken
+from statusAt of the Disassembler (else the flags after reset) and carried along the
+flow; the status with which code is first reached is recorded in statusAt, so the
+listing decodes the immediate operands with the same widths. '''
+
+import re
+
+from disassembler import final
+
+# Values in the map of the image
+UNKNOWN = 0
+CODE = 1
+BLOCK = 2
+
+
+def findCode(dis, image, address, entries):
+    ''' Return a bytearray with for each byte of image (loaded at address) whether it
+        is CODE, in one of the blocks of dis (BLOCK), or not reached (UNKNOWN) '''
+    image = bytes(image)
+    size = len(image)
+    mask = dis.addressMask
+    codemap = bytearray(size)
+    for start, end, btype in dis.blocks:
+        if btype in "abWws":
+            offset = (start - address) & mask
+            count = end - start + 1
+            while count > 0:    # in pieces up to the end of the address space
+                n = min(count, mask + 1 - offset)
+                if offset < size:
+                    codemap[offset:min(offset + n, size)] = bytes([BLOCK]) * (min(offset + n, size) - offset)
+                count -= n
+                offset = 0
+
+    tracking = bool(dis.wideEntries)
+    statusAt = dis.statusAt
+    pending = [(entry, statusAt.get(entry, dis.resetStatus)) for entry in entries]
+    while pending:
+        pc, status = pending.pop()
+        pos = (pc - address) & mask
+        while pos < size and codemap[pos] == UNKNOWN:
+            if tracking:
+                status = statusAt.setdefault(pc, status)
+                ins = dis.decodeInstruction(image, pos, pc, status)
+                if ins is not None:
+                    status = dis.nextStatus(ins, status)
+            else:
+                ins = dis.decodeInstruction(image, pos, pc)
+            if ins is None or ins.mnemonic == "???":
+                break
+            length = len(ins.data)
+            codemap[pos:pos + length] = b"\x01" * length
+            if ins.target is not None:
+                pending.append((ins.target & mask, status))
+            if ins.flags & final:
+                break
+            pos += length
+            pc = (pc + length) & mask
+    return codemap
+
+
+def unreachedBlocks(codemap, address, mask=0xffff):
+    ''' Return the byte blocks [start, end, 'b'] for the UNKNOWN bytes of codemap, for
+        an address space of mask + 1 bytes '''
+    blocks = []
+    for run in re.finditer(b"\x00+", codemap):
+        start = (address + run.start()) & mask
+        end = start + run.end() - run.start() - 1
+        while end > mask:     # a block does not wrap around at the end of the address space
+            blocks.append([start, mask, 'b'])
+            end -= mask + 1
+            start = 0
+        blocks.append([start, end, 'b'])
+    return blocks
+
+
+def vectorEntries(dis, image, address):
+    ''' Return the entry points of image (loaded at address) from the vectors and fixed
+        entry points of the CPU plugin of dis, as far as they are within the image '''
+    size = len(image)
+    entries = []
+    for vector in dis.vectors:
+        pos = (vector - address) & dis.addressMask
+        if pos + 1 < size:
+            if dis.bigEndian:
+                entries.append((image[pos] << 8) + image[pos + 1])
+            else:
+                entries.append(image[pos] + (image[pos + 1] << 8))
+    for entry in dis.entryPoints:
+        if (entry - address) & dis.addressMask < size:
+            entries.append(entry)
+    return entries
+
+
+def followFlow(dis, image, address, entries=None):
+    ''' Add byte blocks to dis for all bytes of image (loaded at address) which are not
+        reached from the entry addresses. Without entries the vectors and entry points
+        of the CPU are used, or else address. '''
+    if not entries:
+        entries = vectorEntries(dis, image, address) or [address]
+    codemap = findCode(dis, image, address, entries)
+    dis.setBlocks(list(dis.blocks) + unreachedBlocks(codemap, address, dis.addressMask))
@@ -0,0 +1,255 @@
+''' differential test of udis.py: compare the listings of this tree with those of
+another version, line by line
+
+    python3 golden.py [options]
+
+The reference is a git revision (--against, defaults to HEAD, so uncommitted changes
+are checked), another directory with udis.py, or listings stored earlier with
+--record (--golden). The cases are made for each CPU plugin:
+  opcodes - every opcode (and every second byte after a leadin byte) with its operand
+  eof     - each instruction cut off by the end of the image, and each leadin byte
+            as the last byte
+  random  - random images of 1 to 5000 bytes
+  rom     - the Acorn Atom ROMs in example/, also with their block files
+  widths  - for the 65816, rep and sep in emulation and native mode
+each with a number of option sets. For each case whose listings differ the first
+line that differs is reported. The --stats counts of the NumPy path are also checked
+against those of the records of decode, with blocks over the edges of the images. '''
+
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from disassembler import Disassembler, PLUGINDIR
+import stats
+
+PLUGINS = ("1802", "6502", "6502_labels", "65816", "65c02", "6800", "6801", "6809", "6811",
+           "8051", "8080", "8085", "z80")
+# Options of every case, and the fewer options of the many small eof cases
+OPTIONS = ("", "-n", "-u -i", "-n -i -a 0xFFF0", "-a 65530")
+EOFOPTIONS = ("", "-n -u -i")
+RANDOMSIZES = (1, 2, 3, 5, 300, 5000)
+# 65816 register widths: rep before and after the switch to native mode ("clc; xce"),
+# and back to emulation mode ("sec; xce")
+WIDTHS = bytes((0xc2, 0x30, 0xa9, 0x34, 0xea, 0xea,                  # rep #$30; lda #$34; nop; nop
+                0x18, 0xfb, 0xc2, 0x30, 0xa9, 0x34, 0xea, 0xea,      # clc; xce; rep #$30; lda #$EA34; nop
+                0xa2, 0x78, 0xea, 0xea,                              # ldx #$EA78; nop
+                0x38, 0xfb, 0xa9, 0x34, 0xea, 0xea))                 # sec; xce; lda #$34; nop; nop
+ROMS = (("Atom_Basic.rom", "0xC000", "basicblock.txt"), ("Atom_Kernel.rom", "0xF000", "kernelblock.txt"))
+# Load addresses of the --stats checks, and their blocks as (at the end of the image,
+# offset, length, type): over the start of the image, in it, and over its end
+STATSADDRESSES = (0xF000, 0xFFF0)
+STATSBLOCKS = ((False, -0x10, 0x20, 'b'), (False, 0x101, 0x80, 's'), (True, -0x11, 0x21, 'w'), (True, -0x10, 0x20, 'a'))
+
+# Runs the cases (name, argv) read as JSON from standard input with the udis.py in
+# the directory given as argument, and writes the listings as JSON
+DRIVER = r"""
+import contextlib, io, json, os, runpy, sys
+engine = sys.argv[1]
+sys.path.insert(0, engine)
+results = {}
+for name, argv in json.load(sys.stdin):
+    out = io.StringIO()
+    sys.argv = [os.path.join(engine, "udis.py")] + argv
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            runpy.run_path(sys.argv[0], run_name="__main__")
+    except SystemExit:
+        pass
+    except Exception as error:
+        out.write("EXCEPTION {}: {}".format(type(error).__name__, error))
+    results[name] = out.getvalue()
+json.dump(results, sys.stdout)
+"""
+
+
+def opcodeImage(dis):
+    ''' Return an image with each opcode of dis once, followed by its operand bytes '''
+    image = bytearray()
+    operand = bytes(range(0x12, 0x12 + dis.maxLength))
+    for opcode, entry in enumerate(dis.decodeTable):
+        if entry.__class__ is list:
+            for code, second in enumerate(entry):
+                image += bytes((opcode, code)) + operand[:(second[0] if second else 2) - 2]
+        else:
+            image.append(opcode)
+            image += operand[:(entry[0] if entry else 1) - 1]
+    return bytes(image)
+
+
+def eofImages(dis):
+    ''' Return (name, image) for each instruction of dis cut off by the end of the
+        image, and each leadin byte at the end '''
+    images = []
+    operand = bytes(range(0x12, 0x12 + dis.maxLength))
+    for opcode, entry in enumerate(dis.decodeTable):
+        if entry.__class__ is list:
+            images.append(("{0:02x}".format(opcode), bytes((opcode,))))
+            for code, second in enumerate(entry):
+                if second and second[0] > 2:
+                    images.append(("{0:02x}{1:02x}".format(opcode, code), bytes((opcode, code)) + operand[:second[0] - 3]))
+        elif entry and entry[0] > 1:
+            images.append(("{0:02x}".format(opcode), bytes((opcode,)) + operand[:entry[0] - 2]))
+    return images
+
+
+def makeCases(directory, cpus, extra, seed):
+    ''' Write the images of the cases in directory; return the list of (name, argv),
+        whose file names are relative to directory '''
+    cases = []
+    rng = random.Random(seed)
+
+    def write(name, image):
+        filename = os.path.join(directory, name)
+        with open(filename, "wb") as f:
+            f.write(image)
+        open(os.path.splitext(filename)[0] + ".lbl", "w").close()     # for 6502_labels
+        return name
+
+    def add(name, cpu, filename, options, before=()):
+        for option in options + tuple(extra):
+            cases.append(("{0}.{1}".format(name, option.replace(" ", "_")),
+                          ["-c", cpu] + list(before) + option.split() + [filename]))
+
+    for size in RANDOMSIZES:
+        write("rand{0}.bin".format(size), rng.randbytes(size))
+    for rom, address, block in ROMS:
+        for name in (rom, block, os.path.splitext(rom)[0] + ".lbl"):
+            shutil.copy(os.path.join(PLUGINDIR, "example", name), directory)
+
+    for cpu in cpus:
+        dis = Disassembler(cpu, undocumented=True)
+        add(cpu + ".opcodes", cpu, write(cpu + ".opcodes.bin", opcodeImage(dis)), OPTIONS)
+        for name, image in eofImages(dis):
+            add("{0}.eof{1}".format(cpu, name), cpu, write("{0}.eof{1}.bin".format(cpu, name), image), EOFOPTIONS)
+        for size in RANDOMSIZES:
+            add("{0}.rand{1}".format(cpu, size), cpu, "rand{0}.bin".format(size), OPTIONS)
+        if dis.widthFlags:
+            add(cpu + ".widths", cpu, write(cpu + ".widths.bin", WIDTHS), OPTIONS)
+        for rom, address, block in ROMS:
+            add("{0}.{1}".format(cpu, rom), cpu, rom, OPTIONS)
+            add("{0}.{1}.blocks".format(cpu, rom), cpu, rom, ("", "-n"), ("-a", address, "-b", block))
+    return cases
+
+
+def checkStats(cpus, seed):
+    ''' Return the names of the --stats checks whose NumPy counts differ from those of
+        the records of decode '''
+    rng = random.Random(seed)
+    with open(os.path.join(PLUGINDIR, "example", ROMS[1][0]), "rb") as f:
+        images = (f.read(), rng.randbytes(RANDOMSIZES[-1]))
+    failed = []
+    for cpu in cpus:
+        dis = Disassembler(cpu, undocumented=True)
+        if dis.wideEntries:
+            continue            # counted from the records anyway
+        keys = stats.OpcodeKeys(dis)
+        for address in STATSADDRESSES:
+            for number, image in enumerate(images):
+                starts = [((address + offset + (len(image) if atEnd else 0)) & dis.addressMask, length, btype)
+                          for atEnd, offset, length, btype in STATSBLOCKS]
+                dis.setBlocks([[start, start + length - 1, btype] for start, length, btype in starts])
+                if stats.countArrays(dis, image, address, keys, 1024) != stats.countRecords(dis, image, address, keys, 1024):
+                    failed.append("{0}.stats{1}.{2:X}".format(cpu, number, address))
+    return failed
+
+
+def checkout(revision, directory):
+    ''' Extract git revision of this tree in directory '''
+    archive = subprocess.run(["git", "-C", PLUGINDIR, "archive", revision], capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+
+
+def run(engine, cases, directory, jobs):
+    ''' Return the listings {name: text} of cases made by the udis.py in directory engine,
+        run in the directory of the case files: the label files of the images are read
+        from their names relative to it '''
+    parts = [cases[i::jobs] for i in range(jobs)]
+
+    def runPart(part):
+        process = subprocess.run([sys.executable, "-c", DRIVER, engine], input=json.dumps(part),
+                                 cwd=directory, capture_output=True, text=True, check=True)
+        return json.loads(process.stdout)
+
+    results = {}
+    with ThreadPoolExecutor(jobs) as pool:
+        for listings in pool.map(runPart, parts):
+            results.update(listings)
+    return results
+
+
+def firstDifference(old, new):
+    ''' Return (line number, old line, new line) of the first difference of two texts '''
+    a, b = old.splitlines(), new.splitlines()
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return i + 1, x, y
+    i = min(len(a), len(b))
+    return i + 1, a[i] if i < len(a) else "<end>", b[i] if i < len(b) else "<end>"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the listings of udis.py with another version")
+    parser.add_argument("--against", help="Git revision or directory with udis.py to compare with (defaults to HEAD)", default="HEAD")
+    parser.add_argument("--golden", help="Compare with the listings stored by --record in this directory", default="")
+    parser.add_argument("--record", help="Store the listings of this tree in this directory", default="")
+    parser.add_argument("-c", "--cpu", help="CPU plugin (repeatable, defaults to all)", action="append")
+    parser.add_argument("-o", "--options", help="Extra option set for every case, e.g. \"-p 4 -l\" (repeatable; both versions must have the options)",
+                        action="append", default=[])
+    parser.add_argument("-j", "--jobs", help="Number of processes for each version (defaults to the number of CPUs)", type=int,
+                        default=os.cpu_count())
+    parser.add_argument("--seed", help="Seed for the random images (defaults to 1)", type=int, default=1)
+    parser.add_argument("--show", help="Number of differences to show (defaults to 20)", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work:
+        cases = makeCases(work, args.cpu or PLUGINS, args.options, args.seed)
+        current = run(PLUGINDIR, cases, work, args.jobs)
+        if args.record:
+            os.makedirs(args.record, exist_ok=True)
+            with open(os.path.join(args.record, "listings.json"), "w") as outfd:
+                json.dump(current, outfd)
+            print("{0} listings stored in {1}".format(len(current), args.record))
+            return 0
+        if args.golden:
+            with open(os.path.join(args.golden, "listings.json"), "r") as infd:
+                reference = json.load(infd)
+        elif os.path.isdir(args.against):
+            reference = run(os.path.abspath(args.against), cases, work, args.jobs)
+        else:
+            engine = os.path.join(work, "reference")
+            checkout(args.against, engine)
+            reference = run(engine, cases, work, args.jobs)
+
+    differences = 0
+    for name, argv in cases:
+        if name not in reference:
+            continue
+        if current[name] != reference[name]:
+            differences += 1
+            if differences <= args.show:
+                line, old, new = firstDifference(reference[name], current[name])
+                print("DIFF {0} line {1}\n  - {2}\n  + {3}".format(name, line, old, new))
+    print("{0} cases, {1} differ".format(len(cases), differences))
+
+    if stats.numpy is None:
+        print("stats checks skipped: NumPy is not installed")
+        return 1 if differences else 0
+    failed = checkStats(args.cpu or PLUGINS, args.seed)
+    for name in failed[:args.show]:
+        print("DIFF {0}: NumPy and record counts differ".format(name))
+    print("stats checks, {0} differ".format(len(failed)))
+    return 1 if differences or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,53 @@
-''' labeldependent functions '''
+''' labeldependent functions
 
-import os 
+The functions below get the labels as an index: a dict from address to the
+list of label names at that address (in the order of the label file), as
+made by indexLabels. '''
 
+import os
+
+
+def labelFile(filename):
+    ''' Return the name of the label file belonging to filename '''
+    return os.path.splitext(os.path.abspath(filename))[0] + '.lbl'
 
 # reading the labellist
 def readLabels( filename, labellist):
     ''' read in a list from filename with extension '.lbl' '''
-    fname = os.path.splitext(filename)[0] + '.lbl'
-    fdir = os.path.dirname(os.path.abspath(filename))
-    lblfd = open( fdir + os.sep + fname, "r")
-    lines = lblfd.read().split('\n')
+    readLabelFile(labelFile(filename), labellist)
+
+def readLabelFile(fname, labellist):
+    ''' read in a list from the label file fname '''
+    with open(fname, "r") as lblfd:
+        lines = lblfd.read().split('\n')
     for singleline in lines:
         if singleline.strip() != '':
             line = singleline.split(',')
             label = line[0].strip()
             addr = int(line[1].strip(), base=16)
             labellist.append([label, addr])
-            
-def checkPCAddress(address, labels):
-    ''' Check the current PC is equal to a label-address; if so print that label on a line with colon '''
-    for singlelabelset in labels:
-        if singlelabelset[1] == address:
-            print(singlelabelset[0] +':')
-            
+
+def indexLabels(labellist):
+    ''' make the label index (address -> list of names) from a list of [label, address] '''
+    labels = {}
+    for label, addr in labellist:
+        labels.setdefault(addr, []).append(label)
+    return labels
+
+def getPCLabels(address, labels):
+    ''' Return the label lines (label with colon) for all labels equal to the current PC '''
+    return [name + ':' for name in labels.get(address, ())]
+
 def getFullLabelstring(labels, opcodeformat, highadd, lowadd):
     ''' make a string from the given address and formattingstring '''
     # It's little endian!
     fulladdr = highadd + 256*lowadd
-    for singlelabelset in labels:
-        if singlelabelset[1] == fulladdr:
-            return opcodeformat[1].format(singlelabelset[0])
+    if fulladdr in labels:
+        return opcodeformat[1].format(labels[fulladdr][0])
     return opcodeformat[0].format(highadd, lowadd)
 
 def getFullLabelrel(labels, opcodeformat, fulladd):
     ''' make a string from the given address and formattingstring '''
-    for singlelabelset in labels:
-        if singlelabelset[1] == fulladd:
-            return opcodeformat[1].format(singlelabelset[0])
+    if fulladd in labels:
+        return opcodeformat[1].format(labels[fulladd][0])
     return opcodeformat[0].format(fulladd)
-
-
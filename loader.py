@@ -0,0 +1,192 @@
+''' loaders for binary files with load addresses: Intel HEX, Motorola S-record,
+Commodore PRG and Atari XEX
+
+Each loader returns a memory.SegmentMap with the load addresses from the file, and
+the start addresses given in the file in its entries. Text formats are read line by
+line; records that follow each other in memory are joined into one segment, and the
+gaps between records take no memory. '''
+
+import os
+
+from memory import SegmentMap
+
+# File name extensions of each format
+EXTENSIONS = {
+    ".hex": "ihex", ".ihx": "ihex", ".ihex": "ihex",
+    ".s19": "srec", ".s28": "srec", ".s37": "srec", ".srec": "srec", ".mot": "srec",
+    ".prg": "prg",
+    ".xex": "xex",
+}
+FORMATS = ("raw", "ihex", "srec", "prg", "xex")
+
+
+class Segments:
+    ''' Collects the data records of a file into runs of adjacent bytes '''
+
+    def __init__(self):
+        self.runs = {}      # base -> bytearray
+        self.ends = {}      # address after a run -> base of the run
+
+    def add(self, address, data):
+        base = self.ends.pop(address, None)
+        if base is None:
+            if address in self.runs:
+                raise ValueError("data at ${0:04X} is given twice".format(address))
+            base = address
+            self.runs[base] = bytearray()
+        self.runs[base] += data
+        self.ends[base + len(self.runs[base])] = base
+
+    def segmentMap(self):
+        ''' Return the SegmentMap of the runs, joining runs which turned out adjacent '''
+        segments = SegmentMap()
+        bases = sorted(self.runs)
+        i = 0
+        while i < len(bases):
+            base = bases[i]
+            data = self.runs[base]
+            while i + 1 < len(bases) and bases[i + 1] == base + len(data):
+                i += 1
+                data += self.runs[bases[i]]
+            segments.add(base, data)
+            i += 1
+        return segments
+
+
+def hexRecord(line, lineno, filename):
+    ''' Return the bytes of a hex record line (after its start character), checking
+        its checksum '''
+    try:
+        record = bytes.fromhex(line)
+    except ValueError:
+        raise ValueError("{}:{}: invalid hex digits".format(filename, lineno)) from None
+    if len(record) < 2:
+        raise ValueError("{}:{}: record too short".format(filename, lineno))
+    return record
+
+
+def readIntelHex(filename):
+    ''' Load an Intel HEX file '''
+    segments = Segments()
+    entries = []
+    offset = 0          # from extended segment (02) or linear (04) address records
+    with open(filename, "r") as hexfd:
+        for lineno, line in enumerate(hexfd, 1):
+            line = line.strip()
+            if line == '':
+                continue
+            if line[0] != ':':
+                raise ValueError("{}:{}: record does not start with ':'".format(filename, lineno))
+            record = hexRecord(line[1:], lineno, filename)
+            if len(record) < 5 or len(record) != record[0] + 5:
+                raise ValueError("{}:{}: wrong record length".format(filename, lineno))
+            if sum(record) & 0xff:
+                raise ValueError("{}:{}: checksum error".format(filename, lineno))
+            rtype = record[3]
+            data = record[4:-1]
+            if rtype == 0:
+                segments.add(offset + (record[1] << 8) + record[2], data)
+            elif rtype == 1:
+                break
+            elif rtype == 2:
+                offset = int.from_bytes(data, "big") << 4
+            elif rtype == 4:
+                offset = int.from_bytes(data, "big") << 16
+            elif rtype == 3:
+                cs, ip = int.from_bytes(data[:2], "big"), int.from_bytes(data[2:], "big")
+                entries.append((cs << 4) + ip)
+            elif rtype == 5:
+                entries.append(int.from_bytes(data, "big"))
+    result = segments.segmentMap()
+    result.entries = entries
+    return result
+
+
+def readSRecord(filename):
+    ''' Load a Motorola S-record file (S19, S28 or S37) '''
+    segments = Segments()
+    entries = []
+    # Number of address bytes of each record type
+    addressBytes = {'0': 2, '1': 2, '2': 3, '3': 4, '5': 2, '6': 3, '7': 4, '8': 3, '9': 2}
+    with open(filename, "r") as srecfd:
+        for lineno, line in enumerate(srecfd, 1):
+            line = line.strip()
+            if line == '':
+                continue
+            if line[0] != 'S' or len(line) < 2 or line[1] not in addressBytes:
+                raise ValueError("{}:{}: not an S-record".format(filename, lineno))
+            record = hexRecord(line[2:], lineno, filename)
+            if len(record) != record[0] + 1:
+                raise ValueError("{}:{}: wrong record length".format(filename, lineno))
+            if sum(record) & 0xff != 0xff:
+                raise ValueError("{}:{}: checksum error".format(filename, lineno))
+            rtype = line[1]
+            size = addressBytes[rtype]
+            address = int.from_bytes(record[1:1 + size], "big")
+            if rtype in "123":
+                segments.add(address, record[1 + size:-1])
+            elif rtype in "789":
+                entries.append(address)
+    result = segments.segmentMap()
+    result.entries = entries
+    return result
+
+
+def readPrg(filename):
+    ''' Load a Commodore PRG file: a 2-byte load address (low byte first) and the data '''
+    with open(filename, "rb") as f:
+        image = f.read()
+    if len(image) < 2:
+        raise ValueError("{}: no load address".format(filename))
+    return SegmentMap([(image[0] + (image[1] << 8), memoryview(image)[2:])])
+
+
+def readXex(filename):
+    ''' Load an Atari XEX file: segments with a start and end address (low byte first),
+        the first one after the $FFFF header. The run and init addresses (RUNAD and INITAD,
+        also when given together or in a larger segment) are entries. '''
+    with open(filename, "rb") as f:
+        image = f.read()
+    view = memoryview(image)
+    result = SegmentMap()
+    entries = []
+    pos = 0
+    while pos + 4 <= len(image):
+        start = image[pos] + (image[pos + 1] << 8)
+        if start == 0xffff:
+            pos += 2
+            continue
+        end = image[pos + 2] + (image[pos + 3] << 8)
+        pos += 4
+        if end < start or pos + end - start + 1 > len(image):
+            raise ValueError("{}: bad segment ${:04X}-${:04X}".format(filename, start, end))
+        data = view[pos:pos + end - start + 1]
+        pos += end - start + 1
+        # The words RUNAD ($2E0) and INITAD ($2E2) of a segment over them are entries;
+        # a segment with nothing else is not loaded
+        for vector in (0x2e0, 0x2e2):
+            if start <= vector and vector + 1 <= end:
+                entries.append(data[vector - start] + (data[vector - start + 1] << 8))
+        if not 0x2e0 <= start <= end <= 0x2e3:
+            result.add(start, data)
+    if pos != len(image):
+        raise ValueError("{}: truncated segment".format(filename))
+    result.entries = entries
+    return result
+
+
+LOADERS = {"ihex": readIntelHex, "srec": readSRecord, "prg": readPrg, "xex": readXex}
+
+
+def fileFormat(filename):
+    ''' Return the format of filename from its extension ("raw" if unknown) '''
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower(), "raw")
+
+
+def load(filename, fmt=None):
+    ''' Load filename in format fmt (defaults to the format of its extension); returns
+        a SegmentMap, or None for a raw binary file '''
+    fmt = fmt or fileFormat(filename)
+    if fmt == "raw":
+        return None
+    return LOADERS[fmt](filename)
@@ -0,0 +1,64 @@
+''' sparse memory map: segments of bytes at a base address
+
+Only the bytes of the segments are kept (as memoryviews, so a segment can be a slice
+of a larger buffer without a copy); the gaps between them take no memory. '''
+
+from bisect import bisect_right
+
+
+class SegmentMap:
+    ''' Segments sorted on base address which do not overlap. entries are the start
+        addresses of the program, if known (e.g. from a hex file). '''
+
+    def __init__(self, segments=()):
+        self.bases = []
+        self.segments = []
+        self.entries = []
+        for base, data in segments:
+            self.add(base, data)
+
+    def add(self, base, data):
+        ''' Add the bytes-like data at address base. Raises ValueError if it overlaps
+            a segment already in the map. '''
+        data = memoryview(data).cast("B")
+        if not data:
+            return
+        i = bisect_right(self.bases, base)
+        if i > 0 and self.bases[i - 1] + len(self.segments[i - 1]) > base:
+            raise ValueError("segment at ${0:04X} overlaps segment at ${1:04X}".format(base, self.bases[i - 1]))
+        if i < len(self.bases) and base + len(data) > self.bases[i]:
+            raise ValueError("segment at ${0:04X} overlaps segment at ${1:04X}".format(base, self.bases[i]))
+        self.bases.insert(i, base)
+        self.segments.insert(i, data)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        ''' The segments as (base, memoryview) in address order '''
+        return zip(self.bases, self.segments)
+
+    def size(self):
+        ''' Return the number of bytes in all segments '''
+        return sum(len(data) for data in self.segments)
+
+    def lastAddress(self):
+        ''' Return the address of the last byte, or -1 if the map is empty '''
+        if not self.segments:
+            return -1
+        return self.bases[-1] + len(self.segments[-1]) - 1
+
+    def find(self, address):
+        ''' Return (base, memoryview) of the segment containing address, or None '''
+        i = bisect_right(self.bases, address) - 1
+        if i >= 0 and address < self.bases[i] + len(self.segments[i]):
+            return self.bases[i], self.segments[i]
+        return None
+
+    def read(self, address, count):
+        ''' Return count bytes from address (fewer if a gap or the end is reached) '''
+        found = self.find(address)
+        if found is None:
+            return b""
+        base, data = found
+        return bytes(data[address - base:address - base + count])
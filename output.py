@@ -0,0 +1,50 @@
+''' buffered output of listing lines '''
+
+import sys
+
+
+class LineWriter:
+    ''' Collects lines and writes them to file in chunks of about chunkSize characters.
+        Use as a context manager, or call flush() when done. '''
+
+    def __init__(self, file=None, chunkSize=1 << 16):
+        self.file = sys.stdout if file is None else file
+        self.chunkSize = chunkSize
+        self.lines = []
+        self.size = 0
+
+    def write(self, line):
+        ''' Add one line (without newline) '''
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size >= self.chunkSize:
+            self.flush()
+
+    def writeLines(self, lines):
+        ''' Add all lines from an iterable '''
+        buffered = self.lines
+        size = self.size
+        chunkSize = self.chunkSize
+        for line in lines:
+            buffered.append(line)
+            size += len(line) + 1
+            if size >= chunkSize:
+                self.size = size
+                self.flush()
+                size = 0
+        self.size = size
+
+    def flush(self):
+        ''' Write the collected lines '''
+        if self.lines:
+            self.lines.append("")
+            self.file.write("\n".join(self.lines))
+            self.lines.clear()
+        self.size = 0
+        self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
@@ -0,0 +1,173 @@
+''' disassembly of one image in chunks by a pool of worker processes
+
+The image is only split where decoding the whole image certainly has a record
+boundary, so the stitched listing is the same as that of Disassembler.disassemble:
+  - after a byte, ascii or string block of at least maxLength - 1 bytes (an
+    instruction before the block can not run over all of it, so the block is left
+    at its end)
+  - in a run of at least MINFILL equal bytes outside the blocks, where the byte is
+    an instruction of one byte or an invalid opcode (maxLength - 1 bytes into the run
+    any instruction before the run has ended)
+Word blocks are not used, as their end depends on where they are entered.
+
+Labels and cross references are resolved for the whole image: the workers first
+give the targets and references of their chunk, and the chunks are formatted once
+all labels are known.
+
+With register width tracking (65816) the widths at the start of a chunk depend on
+all the code before it, so the status at each split point is found by a decode of
+the image (without formatting) before the chunks are handed out. '''
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from disassembler import Disassembler
+from profiling import Profile, NOPROFILE
+import xref
+
+# Minimum length of a run of fill bytes to split in
+MINFILL = 16
+# Minimum size of a chunk
+MINCHUNK = 4096
+
+FILLRUN = re.compile(b"(.)\\1{%d,}" % (MINFILL - 1), re.S)
+
+# Disassembler and image of a worker process (set by setup)
+_dis = None
+_image = None
+
+
+def splitPoints(dis, image, address):
+    ''' Return the sorted offsets in image (loaded at address) where it may be split '''
+    size = len(image)
+    maxLength = dis.maxLength
+    points = set()
+    for start, end, btype in dis.blocks:
+        if btype in "abs" and end - start + 1 >= maxLength - 1:
+            pos = end + 1 - address
+            if 0 < pos < size:
+                points.add(pos)
+    for run in FILLRUN.finditer(image):
+        entry = dis.decodeTable[run.group(1)[0]]
+        if entry.__class__ is list or (entry is not None and entry[0] != 1):
+            continue
+        block, low, high = dis.blocks.lookup((address + run.start()) & dis.addressMask)
+        if block is not None or high < address + run.end() - 1:
+            continue
+        pos = run.start() + maxLength - 1
+        if pos < run.end():
+            points.add(pos)
+    return sorted(points)
+
+
+def chunks(dis, image, address, count):
+    ''' Return a list of (start, stop) offsets splitting image in at most count chunks
+        of about the same size '''
+    size = len(image)
+    points = splitPoints(dis, image, address)
+    bounds = [0]
+    step = max(size // count, MINCHUNK)
+    i = 0
+    for want in range(step, size, step):
+        while i < len(points) and (points[i] < want or points[i] - bounds[-1] < MINCHUNK):
+            i += 1
+        if i == len(points):
+            break
+        bounds.append(points[i])
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def chunkStatus(dis, image, address, parts):
+    ''' Return the register width status at the start of each of the chunks parts,
+        or None for each chunk if dis does not track register widths '''
+    if not dis.wideEntries:
+        return [None] * len(parts)
+    statuses = [None]
+    starts = [start for start, stop in parts[1:]]
+    pos = 0
+    status = dis.resetStatus
+    for status, ins in dis.trackStatus(dis.decode(image, address, 0, parts[-1][0])):
+        while len(statuses) <= len(starts) and starts[len(statuses) - 1] == pos:
+            statuses.append(status)
+        pos += len(ins.data)
+        if ins.mnemonic[0] != "." and ins.mnemonic != "end":
+            status = dis.nextStatus(ins, status)
+    if len(statuses) < len(parts):
+        statuses.append(status)
+    return statuses
+
+
+def setup(options, digits, blocks, labelindex, statusAt, image):
+    ''' Worker initializer: make the Disassembler for the image '''
+    global _dis, _image
+    _dis = Disassembler(**options)
+    _dis.addressDigits = digits
+    _dis.setBlocks(blocks)
+    _dis.labelindex = labelindex
+    _dis.statusAt = statusAt
+    _image = image
+
+
+def scanChunk(address, start, stop, status, labels, references):
+    ''' Return the targets (see Disassembler.findTargets) and references of a chunk '''
+    records = list(_dis.decode(_image, address, start, stop, status))
+    targets = _dis.findTargets(records) if labels else None
+    refs = []
+    if references:
+        for ins in records:
+            ref = xref.reference(_dis, ins)
+            if ref is not None:
+                refs.append((ref[0], ins.address, ref[1]))
+    return targets, refs
+
+
+def formatChunk(address, start, stop, status, labelindex, comments, count=False):
+    ''' Return the output lines of a chunk and, with count, its --profile counters '''
+    _dis.labelindex = labelindex
+    _dis.comments = comments
+    records = _dis.decode(_image, address, start, stop, status)
+    profile = Profile(count)
+    if count:
+        records = list(records)
+        profile.count(_dis, records)
+    return list(_dis.formatListing(records)), profile.counters
+
+
+def disassemble(dis, image, address, jobs=None, labels=False, references=False, profile=NOPROFILE):
+    ''' Return the output lines of image loaded at address, decoded and formatted by
+        jobs worker processes (defaults to the number of CPUs). With labels, labels
+        are added as by Disassembler.addTargetLabels, with references the comments
+        as by xref.addComments. The counters of the chunks are added to profile. '''
+    image = bytes(image)
+    jobs = jobs or os.cpu_count()
+    options = {"cpu": dis.cpu, "nolist": dis.nolist, "undocumented": dis.undocumented,
+               "invalid": dis.invalid, "perLine": dis.perLine, "charset": dis.charset}
+    dis.setAddressDigits((address & dis.addressMask) + len(image) - 1)
+    with ProcessPoolExecutor(jobs, initializer=setup,
+                             initargs=(options, dis.addressDigits, list(dis.blocks), dis.labelindex, dis.statusAt, image)) as pool:
+        parts = chunks(dis, image, address, 4 * jobs)
+        statuses = chunkStatus(dis, image, address, parts)
+        if labels or references:
+            futures = [pool.submit(scanChunk, address, start, stop, status, labels, references)
+                       for (start, stop), status in zip(parts, statuses)]
+            results = [future.result() for future in futures]
+            if labels:
+                starts = set()
+                targets = {}
+                for found, refs in results:
+                    starts.update(found[0])
+                    for target, iscall in found[1].items():
+                        targets[target] = targets.get(target) or iscall
+                dis.setTargetLabels(starts, targets)
+            if references:
+                xref.addComments(dis, xref.CrossReferences([ref for found, refs in results for ref in refs]))
+        futures = [pool.submit(formatChunk, address, start, stop, status, dis.labelindex, dis.comments, profile.enabled)
+                   for (start, stop), status in zip(parts, statuses)]
+        lines = []
+        for future in futures:
+            chunk, counters = future.result()
+            lines.extend(chunk)
+            profile.add(counters)
+    return lines
@@ -0,0 +1,114 @@
+''' --profile: wall time of each phase of a run, counters of what was decoded, and
+optionally a cProfile dump and the memory use
+
+The report is JSON: {"phases": {name: seconds}, "total": seconds, "counters": {...}}
+with "memory" added for --trace-memory. When profiling, decoding, formatting and
+writing are done one after the other (instead of line by line) to time them apart. '''
+
+import contextlib
+import json
+import sys
+import time
+
+# Number of allocation sites in the memory report
+TOPALLOCATIONS = 10
+
+
+class Profile:
+    ''' Collects the phase times and counters of one run; without enabled phase() and
+        count() do nothing '''
+
+    def __init__(self, enabled=True, cprofile="", memory=False):
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.memory = memory
+        self.phases = {}
+        self.counters = {}
+        self.profiler = None
+        self.started = time.perf_counter()
+
+    def start(self):
+        ''' Start the cProfile and tracemalloc collection, if asked for '''
+        if self.cprofile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        ''' Context manager adding the time spent in it to phase name '''
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, dis, records):
+        ''' Add the counts of the Instruction records decoded by dis '''
+        if not self.enabled:
+            return
+        labelindex = dis.labelindex
+        counts = dict.fromkeys(("records", "instructions", "invalid", "dataItems", "labelHits"), 0)
+        for ins in records:
+            counts["records"] += 1
+            mnemonic = ins.mnemonic
+            if ins.address in labelindex and mnemonic != ".org":
+                counts["labelHits"] += 1
+            if mnemonic[0] == ".":
+                if mnemonic == ".string":
+                    counts["dataItems"] += len(ins.data)
+                elif mnemonic != ".org":
+                    counts["dataItems"] += len(ins.operands)
+            elif mnemonic == "???":
+                counts["invalid"] += 1
+            elif mnemonic != "end":
+                counts["instructions"] += 1
+                if dis.operandAddress(ins) in labelindex:
+                    counts["labelHits"] += 1
+        self.add(counts)
+
+    def add(self, counters):
+        ''' Add the counters {name: count}, e.g. those of a worker process '''
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        ''' Return the report as a dict '''
+        report = {"phases": self.phases, "total": time.perf_counter() - self.started, "counters": self.counters}
+        if self.memory:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                top = tracemalloc.take_snapshot().statistics("lineno")[:TOPALLOCATIONS]
+                report["memory"] = {"current": current, "peak": peak,
+                                    "top": [{"site": str(stat.traceback), "size": stat.size, "count": stat.count} for stat in top]}
+        return report
+
+    def finish(self, filename):
+        ''' Stop collecting; write the report as JSON to filename ("-" for standard
+            error) if enabled, and the cProfile statistics to the cprofile file '''
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.cprofile)
+        if self.enabled:
+            report = self.report()
+            if filename == "-":
+                json.dump(report, sys.stderr, indent=1)
+                print(file=sys.stderr)
+            else:
+                with open(filename, "w") as outfd:
+                    json.dump(report, outfd, indent=1)
+        if self.memory:
+            import tracemalloc
+            tracemalloc.stop()
+
+
+# Profile of a run without --profile
+NOPROFILE = Profile(False)
@@ -0,0 +1,366 @@
+''' --stats: opcode, addressing mode, invalid and undocumented opcode statistics of
+an image, without making a listing
+
+With NumPy the instruction boundaries and opcodes are found with array operations
+over the whole image: the length of the record starting at each offset comes from a
+table lookup, and the chain of records from the start is followed for all 1 KB
+segments at once (from each offset an instruction can enter a segment at), after
+which the segments are joined. Without NumPy, and for a CPU with register width
+tracking (whose lengths depend on the code before), the records of
+Disassembler.decode are counted. Both give the same numbers. '''
+
+from disassembler import und, z80bit
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Size of the segments followed in parallel
+SEGMENT = 1024
+# Number of regions of the image reported on (the region size is rounded up to 256 bytes)
+REGIONS = 16
+# Block types shown as data
+DATATYPES = "abWws"
+
+
+class Statistics:
+    ''' Counts of the records of an image:
+        opcodes   - list of [opcode text, mnemonic, mode, flags, count] for each opcode
+                    used; mnemonic is "???" for an invalid opcode
+        regions   - list of [start offset, instructions, invalid, undocumented, data
+                    bytes] for each region of regionSize bytes '''
+
+    def __init__(self, size, address, regionSize):
+        self.size = size
+        self.address = address
+        self.regionSize = regionSize
+        self.opcodes = []
+        self.regions = []
+
+
+class OpcodeKeys:
+    ''' Numbers every opcode of a Disassembler: the first byte, or after 256 the leadin
+        byte and second byte, or after those the z80bit prefix and last byte. info has
+        for each key (opcode text, mnemonic, mode, flags), with mnemonic None for an
+        invalid opcode. '''
+
+    def __init__(self, dis):
+        table = dis.decodeTable
+        self.leadIndex = {}
+        self.bitIndex = {}
+        self.info = []
+        for opcode, entry in enumerate(table):
+            self.info.append(self.entryInfo("${0:02X}".format(opcode), entry))
+        for opcode, entry in enumerate(table):
+            if entry.__class__ is list:
+                self.leadIndex[opcode] = len(self.leadIndex)
+                for second, sub in enumerate(entry):
+                    self.info.append(self.entryInfo("${0:02X}{1:02X}".format(opcode, second), sub))
+        self.bitBase = len(self.info)
+        for prefix in sorted(prefix for prefix in dis.bitTables if prefix >> 8 in self.leadIndex):
+            self.bitIndex[prefix] = len(self.bitIndex)
+            for last, sub in enumerate(dis.bitTables[prefix]):
+                self.info.append(self.entryInfo("${0:04X}xx{1:02X}".format(prefix, last), sub))
+
+    @staticmethod
+    def entryInfo(text, entry):
+        if entry is None or entry.__class__ is list:
+            return (text, None, None, 0)
+        return (text, entry[1], entry[2], entry[3])
+
+    def key(self, data):
+        ''' Return the key of the instruction bytes data '''
+        if data[0] not in self.leadIndex:
+            return data[0]
+        key = 256 + self.leadIndex[data[0]] * 256 + data[1]
+        flags = self.info[key][3]
+        if flags & z80bit and len(data) > 3:
+            return self.bitBase + self.bitIndex[(data[0] << 8) + data[1]] * 256 + data[3]
+        return key
+
+
+def regionSize(size):
+    ''' Return the default region size for an image of size bytes '''
+    per = -(-size // REGIONS)
+    return max(256, -(-per // 256) * 256)
+
+
+def collect(dis, image, address, region=None):
+    ''' Return the Statistics of image (bytes) loaded at address, as decoded by dis '''
+    image = bytes(image)
+    stats = Statistics(len(image), address, region or regionSize(len(image)))
+    keys = OpcodeKeys(dis)
+    if numpy is not None and not dis.wideEntries:
+        counts, regions = countArrays(dis, image, address, keys, stats.regionSize)
+    else:
+        counts, regions = countRecords(dis, image, address, keys, stats.regionSize)
+    for key, count in enumerate(counts):
+        if count:
+            text, mnemonic, mode, flags = keys.info[key]
+            stats.opcodes.append([text, mnemonic or "???", mode, flags, count])
+    stats.regions = regions
+    return stats
+
+
+def countRecords(dis, image, address, keys, region):
+    ''' Return the count of each opcode key and the region counts, from the records
+        of dis.decode '''
+    counts = [0] * len(keys.info)
+    regions = [[start, 0, 0, 0, 0] for start in range(0, len(image), region)]
+    pos = 0
+    for ins in dis.decode(image, address):
+        mnemonic = ins.mnemonic
+        row = regions[pos // region] if pos < len(image) else None
+        if mnemonic[0] == ".":
+            # Data bytes are counted in the region they are in
+            offset, end = pos, pos + len(ins.data)
+            while offset < end:
+                after = min(end, (offset // region + 1) * region)
+                regions[offset // region][4] += after - offset
+                offset = after
+        elif mnemonic != "end":
+            key = keys.key(ins.data)
+            counts[key] += 1
+            if mnemonic == "???":
+                row[2] += 1
+            else:
+                row[1] += 1
+                if keys.info[key][3] & und:
+                    row[3] += 1
+        pos += len(ins.data)
+    return counts, regions
+
+
+def recordSteps(dis, img, address, keys):
+    ''' Return (steps, inBlock, inWords): for each offset of the uint8 array img the
+        length of the record decode gives there (the length of the data records of a
+        whole block, as from its start), whether it is in a data block, and whether
+        that is a block of words '''
+    size = len(img)
+    table = dis.decodeTable
+    first = numpy.array([entry[0] if entry.__class__ is tuple else 1 if entry is None else 0 for entry in table],
+                        numpy.int32)
+    steps = first[img]
+    if keys.leadIndex:
+        lead = numpy.zeros(256, bool)
+        lead[list(keys.leadIndex)] = True
+        second = numpy.full((len(table), 256), 2, numpy.int32)
+        for opcode in keys.leadIndex:
+            second[opcode] = [sub[0] if sub else 2 for sub in table[opcode]]
+        positions = numpy.flatnonzero(lead[img])
+        inside = positions[positions + 1 < size]
+        steps[inside] = second[img[inside], img[inside + 1]]
+        steps[positions[positions + 1 >= size]] = 2          # leadin at the end
+
+    inBlock = numpy.zeros(size, bool)
+    inWords = numpy.zeros(size, bool)
+    blocks = [(start, end, btype in "Ww") for start, end, btype in dis.blocks if btype in DATATYPES]
+    if not blocks:
+        return steps, inBlock, inWords
+    start, end, words = (numpy.array(column, numpy.int64) for column in zip(*blocks))
+    # Each block in each copy of the address space in the image; a block over the
+    # load address starts before offset 0, and is clipped there
+    space = dis.addressMask + 1
+    offset = (start - address) % space
+    origin = address & dis.addressMask
+    offset[(start < origin) & (end >= origin)] -= space
+    copies = numpy.maximum(-(-(size - offset) // space), 0)
+    block = numpy.repeat(numpy.arange(len(blocks)), copies)
+    offset = offset[block] + space * (numpy.arange(len(block)) - numpy.repeat(numpy.cumsum(copies) - copies, copies))
+    last = offset + (end - start)[block]
+    first = numpy.maximum(offset, 0)
+    lengths = numpy.minimum(last + 1, size) - first
+    # The offsets in the blocks, with the last offset of their block
+    index = numpy.repeat(first - numpy.cumsum(lengths) + lengths, lengths) + numpy.arange(lengths.sum())
+    last = numpy.repeat(last, lengths)
+    word = numpy.repeat(words[block].astype(bool), lengths)
+    # A word may end after the block end
+    steps[index] = numpy.where(word, 2 * ((last - index) // 2 + 1), last - index + 1)
+    inBlock[index] = True
+    inWords[index] = word
+    return steps, inBlock, inWords
+
+
+def followChain(nxt, width):
+    ''' Return a bool array of the offsets on the chain of records from offset 0, with
+        nxt the offset after the record at each offset '''
+    size = len(nxt)
+    count = -(-size // SEGMENT)
+    bases = numpy.arange(count, dtype=numpy.int32) * SEGMENT
+    ends = numpy.minimum(bases + SEGMENT, size)
+    # marks: bit e is set for the offsets visited entering the segment at offset e.
+    # The chains from the other entries are followed until they meet that from entry
+    # 0 (at merged), as they are the same from there.
+    marks = numpy.zeros(count * SEGMENT, numpy.uint8)
+    exits = numpy.empty((width, count), numpy.int32)
+    merged = numpy.empty((width, count), numpy.int32)
+    merged[0] = bases
+    merged[1:] = ends
+    for e in range(width):
+        pos = numpy.minimum(bases + e, ends)
+        active = numpy.flatnonzero(pos < ends)
+        while len(active):
+            visited = pos[active]
+            if e:
+                meet = (marks[visited] & 1).astype(bool)
+                pos[active[meet]] = exits[0][active[meet]]
+                merged[e][active[meet]] = visited[meet]
+                active = active[~meet]
+                visited = visited[~meet]
+            marks[visited] |= 1 << e
+            pos[active] = nxt[visited]
+            active = active[pos[active] < ends[active]]
+        exits[e] = pos
+
+    # Join the segments: the entry offset of each segment on the chain
+    entries = numpy.full(count, width, numpy.int32)    # width: not on the chain
+    onChain = numpy.zeros(count * SEGMENT, bool)
+    exitList = exits.tolist()
+    pos = 0
+    while pos < size:
+        segment = pos // SEGMENT
+        e = pos - segment * SEGMENT
+        if e < width:
+            entries[segment] = e
+            pos = exitList[e][segment]
+        else:               # entered further in (after a data block), followed one by one
+            end = min((segment + 1) * SEGMENT, size)
+            while pos < end:
+                onChain[pos] = True
+                pos = int(nxt[pos])
+    chained = numpy.flatnonzero(entries < width)
+    entry = entries[chained]
+    rows = marks.reshape(count, SEGMENT)[chained]
+    local = numpy.arange(SEGMENT, dtype=numpy.int32)
+    onChain.reshape(count, SEGMENT)[chained] |= (((rows >> entry[:, None].astype(numpy.uint8)) & 1).astype(bool) |
+        ((rows & 1).astype(bool) & (local >= (merged[entry, chained] - bases[chained])[:, None])))
+    return onChain[:size]
+
+
+def decodeArrays(dis, img, address, keys):
+    ''' Return (starts, key, data) for the uint8 array img loaded at address: the
+        offsets of the instructions decode gives, their opcode keys, and the offsets of
+        the data bytes. For a CPU with register width tracking they come from the
+        records of decode (see recordArrays). '''
+    if dis.wideEntries:
+        return recordArrays(dis, img, address, keys)
+    size = len(img)
+    steps, inBlock, inWords = recordSteps(dis, img, address, keys)
+    nxt = numpy.arange(size, dtype=numpy.int32) + steps
+    onChain = followChain(nxt, max(dis.maxLength, 2))
+    # Instructions cut off by the end of the image are not decoded
+    starts = numpy.flatnonzero(onChain & ~inBlock & (nxt <= size))
+    # The data records of a block run from where the chain enters it, up to the end
+    # of the image (in whole words)
+    runs = numpy.flatnonzero(onChain & inBlock)
+    data = runs
+    if len(runs):
+        left = size - runs
+        left[inWords[runs]] &= ~1
+        coverage = numpy.zeros(size + 1, numpy.int32)
+        numpy.add.at(coverage, runs, 1)
+        numpy.add.at(coverage, runs + numpy.minimum(steps[runs], left), -1)
+        data = numpy.flatnonzero(numpy.cumsum(coverage[:size]) > 0)
+
+    first = img[starts]
+    key = first.astype(numpy.int64)
+    if keys.leadIndex:
+        leadIndex = numpy.full(256, -1, numpy.int64)
+        for opcode, index in keys.leadIndex.items():
+            leadIndex[opcode] = index
+        lead = numpy.flatnonzero(leadIndex[first] >= 0)
+        key[lead] = 256 + leadIndex[first[lead]] * 256 + img[starts[lead] + 1]
+    if keys.bitIndex:
+        bitIndex = numpy.full(len(keys.info), -1, numpy.int64)
+        for prefix, index in keys.bitIndex.items():
+            bitIndex[256 + keys.leadIndex[prefix >> 8] * 256 + (prefix & 0xff)] = index
+        bit = numpy.flatnonzero(bitIndex[key] >= 0)
+        bit = bit[starts[bit] + 3 < size]
+        key[bit] = keys.bitBase + bitIndex[key[bit]] * 256 + img[starts[bit] + 3]
+    return starts, key, data
+
+
+def recordArrays(dis, img, address, keys):
+    ''' Return (starts, key, data) as decodeArrays, from the records of dis.decode '''
+    starts = []
+    key = []
+    data = []
+    pos = 0
+    for ins in dis.decode(img.tobytes(), address):
+        mnemonic = ins.mnemonic
+        if mnemonic[0] == ".":
+            data.extend(range(pos, pos + len(ins.data)))
+        elif mnemonic != "end":
+            starts.append(pos)
+            key.append(keys.key(ins.data))
+        pos += len(ins.data)
+    return numpy.array(starts, numpy.int64), numpy.array(key, numpy.int64), numpy.array(data, numpy.int64)
+
+
+def countArrays(dis, image, address, keys, region):
+    ''' Return the count of each opcode key and the region counts, with NumPy '''
+    img = numpy.frombuffer(image, numpy.uint8)
+    size = len(img)
+    regions = [[start, 0, 0, 0, 0] for start in range(0, size, region)]
+    if size == 0:
+        return [0] * len(keys.info), regions
+    starts, key, data = decodeArrays(dis, img, address, keys)
+
+    counts = numpy.bincount(key, minlength=len(keys.info))
+    invalid = numpy.array([info[1] is None for info in keys.info])[key]
+    undocumented = numpy.array([bool(info[3] & und) for info in keys.info])[key]
+    area = starts // region
+    count = len(regions)
+    columns = (numpy.bincount(area[~invalid], minlength=count), numpy.bincount(area[invalid], minlength=count),
+               numpy.bincount(area[undocumented & ~invalid], minlength=count),
+               numpy.bincount(data // region, minlength=count))
+    for i, row in enumerate(regions):
+        row[1:] = [int(column[i]) for column in columns]
+    return counts.tolist(), regions
+
+
+def report(stats, cpu):
+    ''' Generator for the lines of the report of stats '''
+    digits = max(4, len("{0:X}".format(stats.address + max(stats.size - 1, 0))))
+    hexText = ("${0:0%dX}" % digits).format
+    opcodes = stats.opcodes
+    instructions = sum(row[4] for row in opcodes if row[1] != "???")
+    invalid = sum(row[4] for row in opcodes if row[1] == "???")
+    undocumented = sum(row[4] for row in opcodes if row[1] != "???" and row[3] & und)
+    data = sum(row[4] for row in stats.regions)
+    total = instructions + invalid
+
+    def share(count, whole):
+        return "{0:6.2f}%".format(100.0 * count / whole) if whole else "      -"
+
+    yield "; statistics of {0} bytes at {1}, cpu {2}".format(stats.size, hexText(stats.address), cpu)
+    yield ";   instructions  {0:10d}".format(instructions)
+    yield ";   invalid       {0:10d}  {1}".format(invalid, share(invalid, total))
+    yield ";   undocumented  {0:10d}  {1}".format(undocumented, share(undocumented, total))
+    yield ";   data bytes    {0:10d}".format(data)
+
+    modes = {}
+    for text, mnemonic, mode, flags, count in opcodes:
+        if mnemonic != "???":
+            modes[mode] = modes.get(mode, 0) + count
+    yield ";"
+    yield "; addressing modes"
+    for mode, count in sorted(modes.items(), key=lambda item: (-item[1], item[0])):
+        yield ";   {0:20s} {1:10d}  {2}".format(mode, count, share(count, instructions))
+
+    yield ";"
+    yield "; opcodes"
+    for text, mnemonic, mode, flags, count in sorted(opcodes, key=lambda row: (-row[4], row[0])):
+        kind = "" if mnemonic == "???" else mode + (" (undocumented)" if flags & und else "")
+        yield ";   {0:12s} {1:8s} {2:10d}  {3}  {4}".format(text, mnemonic, count, share(count, total), kind)
+
+    yield ";"
+    yield "; regions ({0} bytes)".format(stats.regionSize)
+    width = 2 * len(hexText(0)) + 1
+    yield ";   {0:{1}s}  {2:>12s} {3:>10s} {4:7s} {5:>12s} {6:>11s}".format(
+        "", width, "instructions", "invalid", "", "undocumented", "data bytes")
+    for start, instrs, bad, undoc, databytes in stats.regions:
+        end = min(start + stats.regionSize, stats.size) - 1
+        yield ";   {0}-{1}  {2:12d} {3:10d} {4} {5:12d} {6:11d}".format(
+            hexText(stats.address + start), hexText(stats.address + end), instrs, bad, share(bad, instrs + bad), undoc, databytes)
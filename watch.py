@@ -0,0 +1,233 @@
+''' incremental listing: keep the listing of an image up to date while the block and
+label files are edited
+
+An Incremental keeps the Instruction records of the image with the output lines of
+each record. When the blocks change, the records are decoded again from the record
+at the first changed address until the new decode meets a record boundary of the
+old one after the last changed address (with the same register widths), and the old
+records are kept from there. Only the new records, those at addresses whose labels
+or cross reference comments changed, and those with an operand referring to such an
+address are formatted again. With flow analysis the flow is followed again (the
+blocks it gives are compared like those of the block file).
+
+watch() writes the listing to a file, and writes it again each time the block or
+label file changes. '''
+
+import itertools
+import os
+import sys
+import time
+from bisect import bisect_left, bisect_right
+
+import block
+import flow
+import label
+import xref
+from output import LineWriter
+
+
+def changedKeys(old, new):
+    ''' Return the set of keys whose value differs between dicts old and new '''
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class Incremental:
+    ''' The listing of image (bytes) loaded at address by dis, with the blocks and
+        labels of dis. flow, labels and references are the -f, -l and -x options;
+        entries are the entry points for flow. '''
+
+    def __init__(self, dis, image, address, flow=False, labels=False, references=False, entries=()):
+        self.dis = dis
+        self.image = bytes(image)
+        self.address = address
+        self.flow = flow
+        self.targetLabels = labels
+        self.references = references
+        self.entries = list(entries)
+        self.seeds = dict(dis.statusAt)
+        self.tracking = bool(dis.wideEntries)
+        dis.setAddressDigits((address & dis.addressMask) + len(self.image) - 1)
+
+        self.apply(list(dis.blocks), list(dis.labellist))
+        if labels:
+            dis.addTargetLabels(self.image, address)
+        self.records = []
+        self.offsets = []       # offset in image of each record
+        self.statuses = []      # register width status before each record, if tracked
+        self.lines = []         # output lines of each record, None if not formatted yet
+        self.keep(list(dis.decode(self.image, address)), 0, 0)
+        self.addComments()
+        self.format(())
+
+    def apply(self, blocks, labellist):
+        ''' Set the blocks (with those of flow analysis) and labels from the files in dis '''
+        dis = self.dis
+        dis.statusAt = dict(self.seeds)
+        dis.setBlocks(blocks)
+        if self.flow:
+            flow.followFlow(dis, self.image, self.address, self.entries)
+        dis.labellist = labellist
+        dis.labelindex = label.indexLabels(labellist)
+
+    def addTargetLabels(self):
+        ''' Add the labels of the branch, jump and call targets of the records to the
+            labels of the label file '''
+        dis = self.dis
+        dis.labelindex = label.indexLabels(dis.labellist)
+        dis.setTargetLabels(*dis.findTargets(self.records))
+
+    def addComments(self):
+        ''' Set the cross reference comments for the records '''
+        dis = self.dis
+        if self.references:
+            dis.comments = {}
+            xref.addComments(dis, xref.collect(dis, self.records))
+
+    def format(self, addresses):
+        ''' Format the records which are not formatted yet, and those at or with an
+            operand referring to one of addresses; return their number '''
+        dis = self.dis
+        lines = self.lines
+        count = 0
+        for i, ins in enumerate(self.records):
+            if lines[i] is None or (addresses and (ins.address in addresses or dis.operandAddress(ins) in addresses)):
+                lines[i] = list(dis.formatListing((ins,)))
+                count += 1
+        return count
+
+    def keep(self, records, first, stop):
+        ''' Replace the records with indices first up to stop by records, which start at
+            offset self.offsets[first] (0 for the first call) '''
+        pos = self.offsets[first] if first < len(self.offsets) else 0
+        status = self.statuses[first] if self.tracking and first < len(self.statuses) else None
+        offsets = []
+        statuses = []
+        for status, ins in self.dis.trackStatus(records, status):
+            offsets.append(pos)
+            statuses.append(status)
+            pos += len(ins.data)
+        self.records[first:stop] = records
+        self.lines[first:stop] = [None] * len(records)
+        self.offsets[first:stop] = offsets
+        if self.tracking:
+            self.statuses[first:stop] = statuses
+
+    def ranges(self, addresses):
+        ''' Return the sorted, merged ranges of offsets [first, last] in the image for a
+            list of address ranges (start, end) '''
+        size = len(self.image)
+        mask = self.dis.addressMask
+        ranges = []
+        for start, end in addresses:
+            first = (start - self.address) & mask
+            if first < size:
+                ranges.append([first, min(first + end - start, size - 1)])
+        ranges.sort()
+        merged = []
+        for first, last in ranges:
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        return merged
+
+    def redecode(self, ranges):
+        ''' Decode the records covering the offset ranges again '''
+        dis = self.dis
+        offsets = self.offsets
+        k = 0
+        while k < len(ranges):
+            first, last = ranges[k]
+            k += 1
+            # From the record before the one at first, which may run on now
+            i = bisect_right(offsets, first) - 2
+            if i <= 1:
+                i = 0           # from the start, with the .org
+            start = offsets[i]
+            status = self.statuses[i] if self.tracking else None
+            records = []
+            stop = len(self.records)
+            pos = start
+            for status, ins in dis.trackStatus(dis.decode(self.image, self.address, start, None, status), status):
+                while k < len(ranges) and ranges[k][0] <= pos:
+                    last = max(last, ranges[k][1])
+                    k += 1
+                if pos > last and ins.mnemonic != ".org":
+                    j = bisect_left(offsets, pos, i + 1)
+                    if j < len(offsets) and offsets[j] == pos and (not self.tracking or self.statuses[j] == status):
+                        stop = j
+                        break
+                records.append(ins)
+                pos += len(ins.data)
+            self.keep(records, i, stop)
+
+    def update(self, blocks, labellist):
+        ''' Bring the listing up to date for the blocks and labellist from the files;
+            return the number of records formatted again '''
+        dis = self.dis
+        oldBlocks = set(map(tuple, dis.blocks))
+        oldStatus = dis.statusAt
+        oldLabels = dis.labelindex
+        oldComments = dis.comments
+        self.apply(blocks, labellist)
+
+        changed = [(start, end) for start, end, btype in oldBlocks ^ set(map(tuple, dis.blocks))]
+        changed += [(address, address) for address in changedKeys(oldStatus, dis.statusAt)]
+        if dis.perLine > 1:     # data records end at labels
+            changed += [(address, address) for address in changedKeys(oldLabels, dis.labelindex)]
+        if self.targetLabels:
+            dis.setTargetLabels(*dis.findTargets(self.records))
+        while changed:
+            self.redecode(self.ranges(changed))
+            changed = []
+            if self.targetLabels:
+                decodeLabels = dis.labelindex
+                self.addTargetLabels()
+                if dis.perLine > 1:
+                    changed = [(address, address) for address in changedKeys(decodeLabels, dis.labelindex)]
+        self.addComments()
+        return self.format(changedKeys(oldLabels, dis.labelindex) | changedKeys(oldComments, dis.comments))
+
+    def listing(self):
+        ''' Return an iterator over the output lines '''
+        return itertools.chain.from_iterable(self.lines)
+
+
+def modified(filename):
+    ''' Return the modification time of filename, or None if it does not exist '''
+    try:
+        return os.stat(filename).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def writeListing(session, output):
+    with open(output, "w") as outfd, LineWriter(outfd) as writer:
+        writer.writeLines(session.listing())
+
+
+def watch(session, output, blockFile, labelFile, interval=0.5):
+    ''' Write the listing of session to output, and again each time blockFile or
+        labelFile ("" if not used) changes, until interrupted '''
+    writeListing(session, output)
+    files = [name for name in (blockFile, labelFile) if name]
+    times = [modified(name) for name in files]
+    print("watching " + ", ".join(files), file=sys.stderr)
+    while True:
+        time.sleep(interval)
+        now = [modified(name) for name in files]
+        if now == times:
+            continue
+        times = now
+        start = time.perf_counter()
+        try:
+            blocks = block.readBlocks(blockFile) if blockFile and os.path.exists(blockFile) else []
+            labellist = []
+            if labelFile and os.path.exists(labelFile):
+                label.readLabelFile(labelFile, labellist)
+        except (OSError, ValueError, IndexError) as error:
+            print("error: {}".format(error), file=sys.stderr)
+            continue
+        count = session.update(blocks, labellist)
+        writeListing(session, output)
+        print("{0} records updated in {1:.3f}s".format(count, time.perf_counter() - start), file=sys.stderr)
@@ -0,0 +1,90 @@
+''' cross references: which instructions refer to which addresses
+
+A reference is (source, target, kind): the address of the instruction, the address
+it refers to, and one of KINDS. References are found for branches, absolute jumps
+and calls, and for all instructions with an absolute (16 or 24-bit) address in
+their operand. Zero page/direct page operands are not included. '''
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from disassembler import pcr, call, write
+
+KINDS = ("call", "jump", "branch", "read", "write", "pointer")
+CALL, JUMP, BRANCH, READ, WRITE, POINTER = range(len(KINDS))
+
+# Number of references on one comment line
+PERLINE = 8
+
+
+class CrossReferences:
+    ''' Columnar store of references, sorted on target (then source): the columns
+        targets, sources and kinds are arrays with one item per reference. '''
+
+    def __init__(self, references=()):
+        references = sorted(references)
+        self.targets = array("L", [ref[0] for ref in references])
+        self.sources = array("L", [ref[1] for ref in references])
+        self.kinds = array("B", [ref[2] for ref in references])
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __iter__(self):
+        ''' All references as (source, target, kind name) '''
+        for i in range(len(self.targets)):
+            yield self.sources[i], self.targets[i], KINDS[self.kinds[i]]
+
+    def referencesTo(self, target, kinds=KINDS):
+        ''' Return the references to target as a list of (source, kind name), optionally
+            only those of the given kinds '''
+        low = bisect_left(self.targets, target)
+        high = bisect_right(self.targets, target, low)
+        return [(self.sources[i], KINDS[self.kinds[i]]) for i in range(low, high)
+                if KINDS[self.kinds[i]] in kinds]
+
+    def callersOf(self, target):
+        ''' Return the addresses of the calls of target '''
+        return [source for source, kind in self.referencesTo(target, ("call",))]
+
+    def referencedAddresses(self):
+        ''' Return the sorted list of addresses with references '''
+        return sorted(set(self.targets))
+
+
+def reference(dis, ins):
+    ''' Return (target, kind) for the Instruction ins decoded by dis, or None when it
+        does not refer to an address '''
+    flags = ins.flags
+    if ins.target is not None:
+        if flags & call:
+            return ins.target, CALL
+        return ins.target, BRANCH if flags & pcr else JUMP
+    fields = dis.referenceFields.get(ins.mode)
+    if fields is None or ins.mnemonic[0] == "." or ins.mnemonic == "???":
+        return None
+    target = 0
+    for i in fields:
+        target = (target << 8) + ins.operands[i]
+    if ins.mode in dis.pointerModes:
+        return target, POINTER
+    return target, WRITE if flags & write else READ
+
+
+def collect(dis, records):
+    ''' Return the CrossReferences of a sequence of Instruction records decoded by dis '''
+    references = []
+    for ins in records:
+        ref = reference(dis, ins)
+        if ref is not None:
+            references.append((ref[0], ins.address, ref[1]))
+    return CrossReferences(references)
+
+
+def addComments(dis, xref):
+    ''' Add "; referenced from" comment lines for the references in xref to dis '''
+    source = ("${0:0%dX} ({1})" % dis.addressDigits).format
+    for target in xref.referencedAddresses():
+        refs = [source(address, kind) for address, kind in xref.referencesTo(target)]
+        lines = ["; referenced from " + ", ".join(refs[i:i + PERLINE]) for i in range(0, len(refs), PERLINE)]
+        dis.comments.setdefault(target, []).extend(lines)
@@ -14,9 +14,37 @@ if dir().count("z80bit") == 0:
 # Maximum length of an instruction (for formatting purposes)
 maxLength = 4
 
+# Width of addresses in bits
+addressWidth = 16
+
 # Leadin bytes for multibyte instructions
 leadInBytes = [0xcb, 0xdd, 0xed, 0xfd]
 
+# Byte order of 16-bit operands
+bigEndian = False
+
+# Flow control, used for flow analysis. Entries are mnemonics, or opcodes
+# where the mnemonic alone is not enough.
+#   jumpInstructions  - jumps and calls to an absolute address operand
+#   callInstructions  - subroutine calls (absolute or pc relative)
+#   finalInstructions - execution does not continue with the next instruction
+jumpInstructions = ["jp", "call"]
+callInstructions = ["call", "rst"]
+finalInstructions = [0xc3, 0xe9, 0xdde9, 0xfde9, 0x18, 0xc9, "reti", "retn"]
+
+# Memory references, used for cross references. Entries as above.
+#   writeInstructions - instructions that write (or modify) their memory operand
+#   pointerModes      - addressing modes with a 16-bit immediate value, which may be an address
+writeInstructions = [0x22, 0x32, 0xdd22, 0xed43, 0xed53, 0xed73, 0xfd22]  # ld (nn),...
+pointerModes = ["bc,nn", "de,nn", "hl,nn", "ix,aa", "iy,aa", "sp,nn"]
+
+# Entry points, used for flow analysis when no entry point is given.
+#   vectors     - addresses of 16-bit pointers to code (in the byte order above)
+#   entryPoints - fixed addresses where execution may start
+vectors = []
+entryPoints = [0x0000, 0x0008, 0x0010, 0x0018, 0x0020, 0x0028, 0x0030, 0x0038,  # reset, rst 08h..38h
+               0x0066]  # nmi
+
 # Addressing mode table
 # List of addressing modes and corresponding format strings for operands.
 addressModeTable = {